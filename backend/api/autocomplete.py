@@ -0,0 +1,134 @@
+import threading
+from bisect import bisect_left, insort
+
+from django.db import transaction
+
+from api.cache import change_versions
+from api.constants import Config
+from api.serializers import IngredientSerializer
+from recipes.models import Ingredient
+
+
+def fold(text):
+    return text.casefold().replace('ё', 'е').strip()
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class IngredientIndex:
+    # Индекс для автодополнения: отсортированный массив названий для
+    # поиска по префиксу и триграммы для поиска по подстроке.
+    # Версия индекса хранится в базе как счётчик: если после
+    # локального изменения счётчик вырос ровно на единицу, индекс
+    # обновляется точечно, иначе перестраивается целиком.
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._version = None
+        self._sorted = []
+        self._entries = {}
+        self._trigrams = {}
+
+    def _current_version(self, request=None):
+        (version, _), = change_versions.get_many(
+            (Config.INGREDIENT_INDEX_SCOPE,), request
+        )
+        return version
+
+    def _add(self, ingredient):
+        folded = fold(ingredient['name'])
+        self._entries[ingredient['id']] = (folded, ingredient)
+        insort(self._sorted, (folded, ingredient['id']))
+        for trigram in trigrams(folded):
+            self._trigrams.setdefault(trigram, set()).add(ingredient['id'])
+
+    def _remove(self, ingredient_id):
+        folded, _ = self._entries.pop(ingredient_id, (None, None))
+        if folded is None:
+            return
+        del self._sorted[bisect_left(self._sorted, (folded, ingredient_id))]
+        for trigram in trigrams(folded):
+            self._trigrams[trigram].discard(ingredient_id)
+
+    def _rebuild(self, version):
+        self._sorted, self._entries, self._trigrams = [], {}, {}
+        for ingredient in IngredientSerializer(
+                Ingredient.objects.all(), many=True).data:
+            self._add(dict(ingredient))
+        self._version = version
+
+    def _bump(self):
+        return change_versions.increment(Config.INGREDIENT_INDEX_SCOPE)
+
+    def _apply(self, ingredient_id, ingredient):
+        version = self._bump()
+        with self._lock:
+            if (
+                version is None or self._version is None
+                or version != self._version + 1
+            ):
+                self._version = None
+                return
+            self._remove(ingredient_id)
+            if ingredient is not None:
+                self._add(ingredient)
+            self._version = version
+
+    def _reset(self):
+        self._bump()
+        with self._lock:
+            self._version = None
+
+    def changed(self, instance, deleted=False):
+        ingredient = (
+            None if deleted else dict(IngredientSerializer(instance).data)
+        )
+        transaction.on_commit(lambda: self._apply(instance.id, ingredient))
+
+    def reset(self):
+        transaction.on_commit(self._reset)
+
+    def _ensure_fresh(self, request=None):
+        version = self._current_version(request)
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self._rebuild(version)
+
+    def search(self, query, limit=None, request=None):
+        query = fold(query)
+        self._ensure_fresh(request)
+        with self._lock:
+            position = bisect_left(self._sorted, (query,))
+            prefix_ids = []
+            for folded, ingredient_id in self._sorted[position:]:
+                if not folded.startswith(query) or (
+                        limit is not None and len(prefix_ids) >= limit):
+                    break
+                prefix_ids.append(ingredient_id)
+            if limit is None or len(prefix_ids) < limit:
+                if len(query) >= 3:
+                    candidates = set.intersection(*(
+                        self._trigrams.get(trigram, set())
+                        for trigram in trigrams(query)
+                    ))
+                else:
+                    candidates = self._entries
+                substring = sorted(
+                    (folded.find(query), folded, ingredient_id)
+                    for ingredient_id in candidates
+                    for folded in (self._entries[ingredient_id][0],)
+                    if query in folded and not folded.startswith(query)
+                )
+                prefix_ids.extend(
+                    ingredient_id for _, _, ingredient_id in substring
+                )
+            return [
+                self._entries[ingredient_id][1]
+                for ingredient_id in prefix_ids[:limit]
+            ]
+
+
+ingredient_index = IngredientIndex()
@@ -0,0 +1,137 @@
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Now
+
+from api.constants import Config
+from recipes.models import ChangeVersion, Recipe
+
+
+class RecipeCache:
+    # Хранит общую для всех пользователей часть представления рецепта.
+    # В ключ входит Recipe.cache_version: изменение рецепта увеличивает
+    # её в той же транзакции, поэтому запрос, прочитавший рецепт до
+    # коммита, пишет устаревшие данные под ключ, который больше никто
+    # не читает. Кэш может быть локальным для процесса.
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self):
+        return settings.RECIPE_CACHE_ENABLED
+
+    @property
+    def cache(self):
+        return caches[settings.RECIPE_CACHE_ALIAS]
+
+    @staticmethod
+    def key(recipe):
+        return Config.RECIPE_CACHE_KEY.format(recipe.id, recipe.cache_version)
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses}
+
+    def reset_stats(self):
+        with self._lock:
+            self.hits = self.misses = 0
+
+    def get_many(self, recipes):
+        if not self.enabled:
+            return {}
+        found = self.cache.get_many([self.key(recipe) for recipe in recipes])
+        result = {
+            recipe.id: found[self.key(recipe)]
+            for recipe in recipes if self.key(recipe) in found
+        }
+        with self._lock:
+            self.hits += len(result)
+            self.misses += len(recipes) - len(result)
+        return result
+
+    def set_many(self, recipes, representations):
+        if self.enabled and representations:
+            self.cache.set_many(
+                {
+                    self.key(recipe): representations[recipe.id]
+                    for recipe in recipes if recipe.id in representations
+                },
+                timeout=settings.RECIPE_CACHE_TIMEOUT
+            )
+
+    @staticmethod
+    def invalidate(recipe_ids):
+        Recipe.objects.filter(pk__in=recipe_ids).update(
+            cache_version=F('cache_version') + 1
+        )
+
+
+recipe_cache = RecipeCache()
+
+
+class ChangeVersions:
+    # Версии последнего изменения данных, по которым строятся
+    # ETag и Last-Modified без рендеринга ответа. Хранятся в базе:
+    # локальный кэш процесса не увидел бы изменений, сделанных
+    # другими воркерами и management-командами.
+
+    @staticmethod
+    def _create_missing(scopes):
+        ChangeVersion.objects.bulk_create(
+            (ChangeVersion(scope=scope) for scope in scopes),
+            ignore_conflicts=True
+        )
+
+    def get_many(self, scopes, request=None):
+        # Версии, уже прочитанные в этом запросе для ETag
+        # (api.conditional), повторно из базы не читаются.
+        stamps = dict(getattr(request, '_change_stamps', {}))
+        unread = [scope for scope in scopes if scope not in stamps]
+        if unread:
+            stamps.update(self._read(unread))
+        missing = [scope for scope in scopes if scope not in stamps]
+        if missing:
+            self._create_missing(missing)
+            stamps.update(self._read(missing))
+        if request is not None:
+            request._change_stamps = stamps
+        return [stamps[scope] for scope in scopes]
+
+    @staticmethod
+    def _read(scopes):
+        return {
+            scope: (version, changed_at.timestamp())
+            for scope, version, changed_at in ChangeVersion.objects.filter(
+                scope__in=scopes
+            ).values_list('scope', 'version', 'changed_at')
+        }
+
+    def _bump_now(self, scopes):
+        updated = ChangeVersion.objects.filter(scope__in=scopes).update(
+            version=F('version') + 1, changed_at=Now()
+        )
+        if updated < len(scopes):
+            self._create_missing(scopes)
+
+    def bump(self, *scopes):
+        scopes = list(set(scopes))
+        if scopes:
+            transaction.on_commit(lambda: self._bump_now(scopes))
+
+    def increment(self, scope):
+        # Новое значение возвращается точно: строка заблокирована
+        # обновлением до конца транзакции.
+        with transaction.atomic():
+            self._bump_now([scope])
+            return ChangeVersion.objects.values_list(
+                'version', flat=True
+            ).get(scope=scope)
+
+
+change_versions = ChangeVersions()
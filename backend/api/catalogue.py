@@ -0,0 +1,78 @@
+import gzip
+import threading
+
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from rest_framework.renderers import JSONRenderer
+
+from api.cache import change_versions
+from recipes.models import Tag
+
+
+class VersionedSnapshot:
+    # Данные справочника в памяти процесса; перестраиваются только
+    # при смене версии.
+
+    def __init__(self, scope):
+        self.scope = scope
+        self._lock = threading.Lock()
+        self._version = None
+        self._value = None
+
+    def build(self, *args):
+        raise NotImplementedError
+
+    def get(self, *args, request=None):
+        version, = change_versions.get_many((self.scope,), request)
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self._value = self.build(*args)
+                    self._version = version
+        return self._value
+
+
+class CatalogueSnapshot(VersionedSnapshot):
+    # Заранее отрендеренный JSON списка и его gzip.
+
+    def build(self, queryset, serializer_class):
+        content = JSONRenderer().render(
+            serializer_class(queryset.all(), many=True).data
+        )
+        return content, gzip.compress(content)
+
+
+class TagSlugMap(VersionedSnapshot):
+    def build(self):
+        return dict(Tag.objects.values_list('slug', 'id'))
+
+
+class CatalogueListMixin:
+    catalogue = None
+
+    def _is_unfiltered(self, request):
+        filterset_class = getattr(self, 'filterset_class', None)
+        return filterset_class is None or not any(
+            request.query_params.get(name)
+            for name in filterset_class.base_filters
+        )
+
+    def list(self, request, *args, **kwargs):
+        if (
+            not isinstance(request.accepted_renderer, JSONRenderer)
+            or not self._is_unfiltered(request)
+        ):
+            return super().list(request, *args, **kwargs)
+        content, gzipped = self.catalogue.get(
+            self.get_queryset(), self.get_serializer_class(), request=request
+        )
+        if 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', ''):
+            response = HttpResponse(gzipped, content_type='application/json')
+            response['Content-Encoding'] = 'gzip'
+        else:
+            response = HttpResponse(content, content_type='application/json')
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
+
+
+tag_ids_by_slug = TagSlugMap('tags')
@@ -0,0 +1,44 @@
+import hashlib
+from datetime import datetime, timezone
+
+from django.views.decorators.http import condition
+from django.views.decorators.vary import vary_on_headers
+
+from api.cache import change_versions
+
+
+def condition_on_versions(*scopes, personal=False):
+    def get_stamps(request):
+        # ETag, Last-Modified и снимки справочников в самом ответе
+        # (api.catalogue, api.autocomplete) берут одни и те же версии,
+        # база читается один раз за запрос.
+        user = request.user
+        request_scopes = (
+            scopes + (f'user:{user.id}',)
+            if personal and user.is_authenticated else scopes
+        )
+        return dict(zip(request_scopes, change_versions.get_many(
+            request_scopes, request
+        )))
+
+    def etag(request, *args, **kwargs):
+        # Слабый ETag: одни и те же данные отдаются и в gzip,
+        # и без сжатия, побайтно эти тела различаются.
+        stamps = sorted(get_stamps(request).items())
+        return f'W/"{hashlib.md5(str(stamps).encode()).hexdigest()}"'
+
+    def last_modified(request, *args, **kwargs):
+        return datetime.fromtimestamp(
+            max(changed_at for _, changed_at in get_stamps(request).values()),
+            tz=timezone.utc
+        )
+
+    def decorator(view):
+        view = condition(etag_func=etag, last_modified_func=last_modified)(
+            view
+        )
+        if personal:
+            view = vary_on_headers('Authorization')(view)
+        return view
+
+    return decorator
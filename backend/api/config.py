@@ -2,7 +2,11 @@
 
 class Error:
     SUBSCRIPTION_YOURSELF = 'Нельзя подписаться на себя'
+    ALREADY_SUBSCRIBED = 'Вы уже подписаны на этого пользователя'
     ALREADY_ADDED = 'Рецепт уже добавлен в {}'
     FILD_IS_EMPTY = 'Поле "{}" не может быть пустым'
     UNIQUE_TAGS = 'Все теги должны быть разными.'
     UNIQUE_INGREDIENTS = 'Все ингредиенты должны быть разными'
+    NOT_FOUND_IDS = 'Не найдены объекты с id: {}'
+    IMAGE_TOO_LARGE = 'Размер изображения не должен превышать {} байт'
+    IMAGE_INVALID_TYPE = 'Допустимые форматы изображения: {}'
@@ -1,3 +1,25 @@
 class Config:
     AMOUNT_MIN_VALUE = 1
     AMOUNT_MAX_VALUE = 32767
+
+    IMAGE_CARD_RENDITION = 'card'
+
+    BULK_RECIPES_MAX_LENGTH = 500
+    BULK_ADDED = 'added'
+    BULK_REMOVED = 'removed'
+    BULK_ALREADY_ADDED = 'already_added'
+    BULK_NOT_ADDED = 'not_added'
+    BULK_NOT_FOUND = 'not_found'
+
+    RECIPE_CACHE_KEY = 'recipe:{}:{}'
+    INGREDIENT_INDEX_SCOPE = 'ingredient-index'
+
+    SHOPPING_LIST_FILENAME = 'shopping_list'
+    SHOPPING_LIST_CHUNK_SIZE = 2000
+    SHOPPING_LIST_SPOOL_SIZE = 1024 * 1024
+    SHOPPING_LIST_CSV_HEADER = ('Ингредиент', 'Единица измерения',
+                                'Количество')
+    SHOPPING_LIST_PDF_FONT = 'ShoppingListFont'
+    SHOPPING_LIST_PDF_FONT_SIZE = 12
+    SHOPPING_LIST_PDF_MARGIN = 40
+    SHOPPING_LIST_PDF_LINE_HEIGHT = 18
@@ -1,13 +1,86 @@
+from django.contrib.auth import get_user_model
+from django.db.models import F, Prefetch, Window
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import RowNumber
+from django.db import IntegrityError, connection
+from django.db.transaction import atomic
 from rest_framework import status
+from rest_framework.exceptions import ValidationError
 from rest_framework.generics import get_object_or_404
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 
-from recipes.models import Recipe
+from api.cache import change_versions
+from api.constants import Config
+from api.shopping_list import change_shopping_list
+from recipes.counters import COUNTERS, change_counter
+from recipes.models import Recipe, RecipeIngredient, ShoppingCart
 
+User = get_user_model()
 
+
+def recipe_ingredients_prefetch():
+    return Prefetch(
+        'recipeingredient_set',
+        queryset=RecipeIngredient.objects.select_related('ingredient')
+    )
+
+
+def recipes_limit(request):
+    limit = request.query_params.get('recipes_limit', '')
+    return int(limit) if limit.isdigit() else None
+
+
+def latest_recipes_prefetch(author_ids, limit=None):
+    # Последние рецепты всех авторов страницы одним запросом:
+    # ROW_NUMBER() OVER (PARTITION BY author ORDER BY add_time DESC).
+    recipes = Recipe.objects.filter(author_id__in=author_ids).only(
+        'id', 'name', 'image', 'cooking_time', 'author_id'
+    )
+    if limit is not None:
+        ranked = recipes.annotate(recipe_rank=Window(
+            RowNumber(),
+            partition_by=F('author_id'),
+            order_by=F('add_time').desc()
+        )).values('id', 'recipe_rank')
+        sql, params = ranked.query.sql_with_params()
+        recipes = recipes.filter(id__in=RawSQL(
+            f'SELECT id FROM ({sql}) ranked WHERE recipe_rank <= %s',
+            (*params, limit)
+        ))
+    return Prefetch(
+        'recipes',
+        queryset=recipes.order_by('-add_time'),
+        to_attr='latest_recipes'
+    )
+
+
+def create_if_absent(model, error, **fields):
+    # Вставка без предварительной проверки: повтор ловится уникальным
+    # ограничением, точка сохранения сохраняет внешнюю транзакцию.
+    # Другие нарушения (например, рецепт или автор удалены параллельно)
+    # повтором не считаются и пробрасываются дальше.
+    try:
+        with atomic():
+            return model.objects.create(**fields)
+    except IntegrityError:
+        if not model.objects.filter(**fields).exists():
+            raise
+        raise ValidationError({api_settings.NON_FIELD_ERRORS_KEY: [error]})
+
+
+def lock_user(user_id):
+    # Все изменения избранного и корзины пользователя, одиночные и
+    # массовые, сначала берут блокировку его строки: порядок блокировок
+    # везде одинаковый, и параллельные запросы не упираются друг в друга.
+    User.objects.select_for_update().filter(id=user_id).exists()
+
+
+@atomic
 def add_object(request, pk, serializer_class):
     recipe_id = get_object_or_404(Recipe, id=pk).id
     user_id = request.user.id
+    lock_user(user_id)
     serializer = serializer_class(
         data={
             'recipe': recipe_id,
@@ -19,7 +92,9 @@ def add_object(request, pk, serializer_class):
     return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
+@atomic
 def delete_object(request, pk, model):
+    lock_user(request.user.id)
     del_object, _ = model.objects.filter(
         user=request.user,
         recipe=pk
@@ -31,11 +106,106 @@ def delete_object(request, pk, model):
     )
 
 
-def shopping_cart_data(ingredients):
-    file_content = '\n'.join(
-        f"{ingredient['ingredient__name']}, "
-        f"{ingredient['ingredient__measurement_unit']}: "
-        f"{ingredient['total_amount']}"
-        for ingredient in ingredients
+def _user_recipes_changed(model, user_id, recipe_ids, sign):
+    # Массовые операции не вызывают сигналы моделей, поэтому счётчики,
+    # список покупок и версия данных пользователя обновляются здесь.
+    if not recipe_ids:
+        return
+    for counter_model, field, related_model, _ in COUNTERS:
+        if related_model is model:
+            change_counter(counter_model, recipe_ids, field, sign)
+    if model is ShoppingCart:
+        change_shopping_list(user_id, recipe_ids, sign)
+    change_versions.bump(f'user:{user_id}')
+
+
+def _bulk_response(recipe_ids, statuses):
+    return Response({
+        'results': [
+            {'id': recipe_id, 'status': statuses[recipe_id]}
+            for recipe_id in recipe_ids
+        ]
+    })
+
+
+def _validated_recipe_ids(request, serializer_class):
+    serializer = serializer_class(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    return serializer.validated_data['recipes']
+
+
+def _insert_missing(model, user_id, recipe_ids):
+    # INSERT ... ON CONFLICT DO NOTHING RETURNING: добавленными
+    # считаются только строки, которые вставка действительно вернула.
+    if not recipe_ids:
+        return set()
+    quote = connection.ops.quote_name
+    user_column = quote(model._meta.get_field('user').column)
+    recipe_column = quote(model._meta.get_field('recipe').column)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {quote(model._meta.db_table)} '
+            f'({user_column}, {recipe_column}) '
+            f'VALUES {", ".join(["(%s, %s)"] * len(recipe_ids))} '
+            f'ON CONFLICT ({user_column}, {recipe_column}) DO NOTHING '
+            f'RETURNING {recipe_column}',
+            [value for recipe_id in recipe_ids
+             for value in (user_id, recipe_id)]
+        )
+        return {recipe_id for recipe_id, in cursor.fetchall()}
+
+
+@atomic
+def add_objects(request, model, serializer_class):
+    recipe_ids = _validated_recipe_ids(request, serializer_class)
+    user_id = request.user.id
+    lock_user(user_id)
+    found = set(
+        Recipe.objects.filter(id__in=recipe_ids).values_list('id', flat=True)
+    )
+    added = _insert_missing(
+        model, user_id,
+        [recipe_id for recipe_id in recipe_ids if recipe_id in found]
     )
-    return file_content
+    _user_recipes_changed(model, user_id, list(added), 1)
+    return _bulk_response(recipe_ids, {
+        recipe_id: (
+            Config.BULK_NOT_FOUND if recipe_id not in found
+            else Config.BULK_ADDED if recipe_id in added
+            else Config.BULK_ALREADY_ADDED
+        )
+        for recipe_id in recipe_ids
+    })
+
+
+def _delete_present(model, user_id, recipe_ids):
+    # DELETE ... RETURNING одним запросом, без загрузки объектов и их
+    # сигналов: счётчики и список покупок обновляются по возвращённым id.
+    quote = connection.ops.quote_name
+    user_column = quote(model._meta.get_field('user').column)
+    recipe_column = quote(model._meta.get_field('recipe').column)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {quote(model._meta.db_table)} '
+            f'WHERE {user_column} = %s AND {recipe_column} IN '
+            f'({", ".join(["%s"] * len(recipe_ids))}) '
+            f'RETURNING {recipe_column}',
+            [user_id, *recipe_ids]
+        )
+        return {recipe_id for recipe_id, in cursor.fetchall()}
+
+
+@atomic
+def delete_objects(request, model, serializer_class):
+    recipe_ids = _validated_recipe_ids(request, serializer_class)
+    user_id = request.user.id
+    lock_user(user_id)
+    removed = _delete_present(model, user_id, recipe_ids)
+    _user_recipes_changed(model, user_id, list(removed), -1)
+    return _bulk_response(recipe_ids, {
+        recipe_id: (
+            Config.BULK_REMOVED if recipe_id in removed
+            else Config.BULK_NOT_ADDED
+        )
+        for recipe_id in recipe_ids
+    })
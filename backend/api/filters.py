@@ -1,37 +1,55 @@
+from django.db.models import Exists, OuterRef
 from django_filters import rest_framework as filters
 
-from recipes.models import Ingredient, Recipe, Tag
+from api.catalogue import tag_ids_by_slug
+from recipes.models import Favorite, Recipe, ShoppingCart
+from recipes.search import search_recipes
 
 
-class IngredientFilter(filters.FilterSet):
-    name = filters.CharFilter(field_name='name', lookup_expr='icontains')
-
-    class Meta:
-        model = Ingredient
-        fields = ('name',)
+def tag_choices():
+    return [(slug, slug) for slug in tag_ids_by_slug.get()]
 
 
 class RecipeFilter(filters.FilterSet):
-    tags = filters.ModelMultipleChoiceFilter(
-        field_name='tags__slug',
-        queryset=Tag.objects.all(),
-        to_field_name='slug'
+    tags = filters.MultipleChoiceFilter(
+        method='filter_tags',
+        choices=tag_choices
     )
     is_in_shopping_cart = filters.BooleanFilter(method='filter_recipes')
     is_favorited = filters.BooleanFilter(method='filter_recipes')
+    search = filters.CharFilter(method='filter_search')
 
     class Meta:
         model = Recipe
-        fields = ('tags', 'is_in_shopping_cart', 'is_favorited', 'author')
+        fields = ('tags', 'is_in_shopping_cart', 'is_favorited', 'author',
+                  'search')
+
+    @staticmethod
+    def filter_tags(queryset, name, slugs):
+        tag_ids = tag_ids_by_slug.get()
+        return queryset.filter(Exists(
+            Recipe.tags.through.objects.filter(
+                recipe=OuterRef('pk'),
+                tag_id__in=[tag_ids[slug] for slug in slugs]
+            )
+        ))
 
     def filter_recipes(self, queryset, name, value):
-        filters_map = {
-            'is_in_shopping_cart': 'shoppingcart__user',
-            'is_favorited': 'favorite__user'
+        models_map = {
+            'is_in_shopping_cart': ShoppingCart,
+            'is_favorited': Favorite
         }
-        filter_field = filters_map[name]
         return (
-            queryset.filter(**{filter_field: self.request.user})
+            queryset.filter(Exists(
+                models_map[name].objects.filter(
+                    user=self.request.user,
+                    recipe=OuterRef('pk')
+                )
+            ))
             if self.request.user.is_authenticated and value
             else queryset
         )
+
+    @staticmethod
+    def filter_search(queryset, name, value):
+        return search_recipes(queryset, value)
@@ -1,6 +1,148 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.db import connection
+from django.db.models import BooleanField
+from django.db.models.expressions import RawSQL
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (Cursor, CursorPagination,
+                                       PageNumberPagination)
+from rest_framework.utils.urls import replace_query_param
 
 
 class PageNumberPaginator(PageNumberPagination):
     page_size_query_param = 'limit'
     page_size = 6
+
+
+class KeysetCursorPagination(CursorPagination):
+    # CursorPagination из DRF фильтрует только по первому полю сортировки
+    # и пропускает одинаковые значения через OFFSET. Здесь курсор хранит
+    # значения всех полей сортировки, а граница страницы — сравнение
+    # строк (add_time, id) < (%s, %s) по составному индексу, без OFFSET.
+    # Все поля сортировки идут в одном направлении.
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        if len({name.startswith('-') for name in self.ordering}) > 1:
+            raise ImproperlyConfigured(
+                'Поля сортировки курсора должны идти в одном направлении'
+            )
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor is not None and self.cursor.reverse
+        ordering = (
+            [_reversed(name) for name in self.ordering]
+            if reverse else self.ordering
+        )
+        queryset = queryset.order_by(*ordering)
+        if self.cursor is not None and self.cursor.position is not None:
+            queryset = queryset.filter(
+                self._after(queryset.model, ordering, self.cursor.position)
+            )
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        has_more = len(results) > self.page_size
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = (
+                self.cursor is not None and self.cursor.position is not None
+            )
+        return self.page
+
+    def _fields(self, model):
+        return [
+            model._meta.get_field(name.lstrip('-')) for name in self.ordering
+        ]
+
+    def _after(self, model, ordering, position):
+        fields = self._fields(model)
+        try:
+            values = json.loads(position)
+            if not isinstance(values, list) or len(values) != len(fields):
+                raise ValueError
+            values = [
+                field.get_db_prep_value(field.to_python(value), connection)
+                for field, value in zip(fields, values)
+            ]
+        except (ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        quote = connection.ops.quote_name
+        table = quote(model._meta.db_table)
+        columns = ', '.join(
+            f'{table}.{quote(field.column)}' for field in fields
+        )
+        operator = '<' if ordering[0].startswith('-') else '>'
+        return RawSQL(
+            f'({columns}) {operator} ({", ".join(["%s"] * len(fields))})',
+            values,
+            output_field=BooleanField()
+        )
+
+    def _link(self, instance, reverse):
+        if instance is None:
+            # Пустая страница: ссылка на начало списка в курсорном режиме.
+            return replace_query_param(
+                self.base_url, self.cursor_query_param, ''
+            )
+        position = json.dumps([
+            field.value_to_string(instance)
+            for field in self._fields(type(instance))
+        ])
+        return self.encode_cursor(
+            Cursor(offset=0, reverse=reverse, position=position)
+        )
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self._link(self.page[-1] if self.page else None, False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        return self._link(self.page[0] if self.page else None, True)
+
+
+def _reversed(name):
+    return name[1:] if name.startswith('-') else f'-{name}'
+
+
+class RecipeCursorPaginator(KeysetCursorPagination):
+    # В курсорном режиме порядок всегда (add_time, id): при поиске
+    # (?search=) сортировка по релевантности действует только
+    # в постраничном режиме.
+    page_size_query_param = 'limit'
+    page_size = 6
+    ordering = ('-add_time', '-id')
+
+
+class UserCursorPaginator(KeysetCursorPagination):
+    page_size_query_param = 'limit'
+    ordering = ('username', 'id')
+
+
+class CursorPaginationMixin:
+    # Курсорная пагинация (без COUNT и OFFSET) включается параметром
+    # cursor, клиенты без него получают прежний формат ответа.
+    cursor_pagination_class = None
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            if (
+                self.cursor_pagination_class is not None
+                and self.cursor_pagination_class.cursor_query_param
+                in self.request.query_params
+            ):
+                self._paginator = self.cursor_pagination_class()
+            else:
+                self._paginator = super().paginator
+        return self._paginator
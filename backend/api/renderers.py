@@ -0,0 +1,23 @@
+from rest_framework.renderers import JSONRenderer
+
+
+class ShoppingListRenderer(JSONRenderer):
+    # Файл отдаётся потоковым ответом в обход рендерера; сам рендерер
+    # нужен для выбора формата и для ответов с ошибками.
+    charset = 'utf-8'
+
+
+class TextShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+
+class CSVShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class PDFShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
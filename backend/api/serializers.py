@@ -1,18 +1,63 @@
+import os
+from collections import OrderedDict
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import UploadedFile
+from django.db.models import Manager, prefetch_related_objects
 from django.db.transaction import atomic
 from djoser.serializers import UserSerializer
 from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
+from rest_framework.relations import MANY_RELATION_KWARGS
 
+from api.cache import recipe_cache
 from api.config import Error
 from api.constants import Config
+from api.core import (create_if_absent, latest_recipes_prefetch,
+                      recipe_ingredients_prefetch, recipes_limit)
+from api.shopping_list import recipe_ingredients_changed
 from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
                             ShoppingCart, Tag)
+from recipes.renditions import rendition_urls
 from users.models import Subscription
 
 User = get_user_model()
 
 
+class ImageUploadField(Base64ImageField):
+    # Принимает и base64-строку, и файл из multipart/form-data.
+    # Размер и тип проверяются до декодирования.
+
+    def _check_size(self, size):
+        if size > settings.UPLOAD_IMAGE_MAX_SIZE:
+            raise serializers.ValidationError(
+                Error.IMAGE_TOO_LARGE.format(settings.UPLOAD_IMAGE_MAX_SIZE)
+            )
+
+    def _invalid_type(self):
+        return serializers.ValidationError(
+            Error.IMAGE_INVALID_TYPE.format(', '.join(self.ALLOWED_TYPES))
+        )
+
+    def to_internal_value(self, data):
+        if isinstance(data, UploadedFile):
+            self._check_size(data.size)
+            extension = os.path.splitext(data.name)[1][1:].lower()
+            if (
+                extension not in self.ALLOWED_TYPES
+                or not (data.content_type or '').startswith('image/')
+            ):
+                raise self._invalid_type()
+            return serializers.ImageField.to_internal_value(self, data)
+        if isinstance(data, str):
+            header, _, encoded = data.rpartition(';base64,')
+            if header and not header.startswith('data:image/'):
+                raise self._invalid_type()
+            self._check_size(len(encoded) * 3 // 4)
+        return super().to_internal_value(data)
+
+
 class FoodGramUserSerializer(UserSerializer):
     is_subscribed = serializers.SerializerMethodField()
 
@@ -21,16 +66,27 @@ class FoodGramUserSerializer(UserSerializer):
         fields = UserSerializer.Meta.fields + ('is_subscribed', 'avatar')
         read_only_fields = fields
 
+    def _subscribed_author_ids(self):
+        # Контекст общий для всех вложенных сериализаторов запроса,
+        # поэтому подписки пользователя загружаются один раз.
+        if 'subscribed_author_ids' not in self.context:
+            self.context['subscribed_author_ids'] = set(
+                self.context['request'].user.subs_to_author.values_list(
+                    'author_id', flat=True
+                )
+            )
+        return self.context['subscribed_author_ids']
+
     def get_is_subscribed(self, user):
         user_request = self.context['request'].user
         return (
             user_request.is_authenticated
-            and user_request.subs_to_author.filter(author=user).exists()
+            and user.id in self._subscribed_author_ids()
         )
 
 
 class AvatarSerializer(UserSerializer):
-    avatar = Base64ImageField()
+    avatar = ImageUploadField()
 
     class Meta:
         model = User
@@ -49,11 +105,74 @@ class IngredientSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit',)
 
 
+def absolute_rendition_urls(request, renditions):
+    if not renditions or request is None:
+        return renditions
+    return {
+        rendition: {
+            extension: request.build_absolute_uri(url)
+            for extension, url in urls.items()
+        }
+        for rendition, urls in renditions.items()
+    }
+
+
+def resolve_ids(queryset, ids):
+    # Все объекты одним запросом, в ошибке — сразу все ненайденные id.
+    found = queryset.in_bulk(set(ids))
+    missing = sorted({pk for pk in ids if pk not in found})
+    if missing:
+        raise serializers.ValidationError(
+            Error.NOT_FOUND_IDS.format(', '.join(map(str, missing)))
+        )
+    return [found[pk] for pk in ids]
+
+
+class BulkManyRelatedField(serializers.ManyRelatedField):
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+        ids = []
+        for item in data:
+            if isinstance(item, bool):
+                self.child_relation.fail(
+                    'incorrect_type', data_type=type(item).__name__
+                )
+            try:
+                ids.append(int(item))
+            except (TypeError, ValueError):
+                self.child_relation.fail(
+                    'incorrect_type', data_type=type(item).__name__
+                )
+        return resolve_ids(self.child_relation.get_queryset(), ids)
+
+
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return BulkManyRelatedField(**list_kwargs)
+
+
+class RecipeIngredientListSerializer(serializers.ListSerializer):
+    def validate(self, ingredients):
+        resolved = resolve_ids(
+            Ingredient.objects.all(),
+            [ingredient['id'] for ingredient in ingredients]
+        )
+        return [
+            dict(ingredient, id=ingredient_object)
+            for ingredient, ingredient_object in zip(ingredients, resolved)
+        ]
+
+
 class CreateRecipeIngredientSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(
-        queryset=Ingredient.objects.all(),
-        required=True
-    )
+    id = serializers.IntegerField(required=True, min_value=1)
     amount = serializers.IntegerField(
         required=True,
         min_value=Config.AMOUNT_MIN_VALUE,
@@ -63,12 +182,13 @@ class CreateRecipeIngredientSerializer(serializers.ModelSerializer):
     class Meta:
         model = RecipeIngredient
         fields = ('id', 'amount')
+        list_serializer_class = RecipeIngredientListSerializer
 
 
 class UpdateCreateRecipeSerializer(serializers.ModelSerializer):
-    image = Base64ImageField(required=True, allow_null=False,
+    image = ImageUploadField(required=True, allow_null=False,
                              allow_empty_file=False)
-    tags = serializers.PrimaryKeyRelatedField(
+    tags = BulkPrimaryKeyRelatedField(
         many=True,
         queryset=Tag.objects.all(),
         allow_empty=False
@@ -104,14 +224,55 @@ class UpdateCreateRecipeSerializer(serializers.ModelSerializer):
         self._create_recipe_ingredients(recipe, ingredients)
         return recipe
 
+    @staticmethod
+    def _update_recipe_ingredients(recipe, ingredients):
+        # Меняются только отличающиеся строки, остальные не трогаются.
+        existing = {
+            recipe_ingredient.ingredient_id: recipe_ingredient
+            for recipe_ingredient in RecipeIngredient.objects.filter(
+                recipe=recipe
+            )
+        }
+        old_amounts = {
+            ingredient_id: recipe_ingredient.amount
+            for ingredient_id, recipe_ingredient in existing.items()
+        }
+        new_amounts = {
+            ingredient['id'].id: ingredient['amount']
+            for ingredient in ingredients
+        }
+        removed = old_amounts.keys() - new_amounts.keys()
+        if removed:
+            RecipeIngredient.objects.filter(
+                recipe=recipe, ingredient_id__in=removed
+            ).delete()
+        changed = [
+            existing[ingredient_id]
+            for ingredient_id, amount in new_amounts.items()
+            if ingredient_id in existing
+            and existing[ingredient_id].amount != amount
+        ]
+        for recipe_ingredient in changed:
+            recipe_ingredient.amount = new_amounts[
+                recipe_ingredient.ingredient_id
+            ]
+        RecipeIngredient.objects.bulk_update(changed, ('amount',))
+        UpdateCreateRecipeSerializer._create_recipe_ingredients(recipe, [
+            ingredient for ingredient in ingredients
+            if ingredient['id'].id not in existing
+        ])
+        recipe_ingredients_changed(recipe.id, old_amounts, new_amounts)
+
     @atomic
     def update(self, recipe, validated_data):
-        ingredients = validated_data.pop('ingredients', [])
-        recipe.ingredients.clear()
-        self._create_recipe_ingredients(recipe, ingredients)
+        ingredients = validated_data.pop('ingredients', None)
+        if ingredients is not None:
+            self._update_recipe_ingredients(recipe, ingredients)
 
-        tags = validated_data.pop('tags', [])
-        recipe.tags.set(tags)
+        tags = validated_data.pop('tags', None)
+        if tags is not None:
+            # set() сравнивает с текущими тегами и меняет только разницу.
+            recipe.tags.set(tags)
 
         return super().update(recipe, validated_data)
 
@@ -129,6 +290,8 @@ class UpdateCreateRecipeSerializer(serializers.ModelSerializer):
         return ingredients
 
     def to_representation(self, recipe):
+        # Версия кэша выросла в базе при сохранении.
+        recipe.refresh_from_db(fields=('cache_version',))
         return GetRecipeSerializer(recipe, context=self.context).data
 
 
@@ -146,6 +309,12 @@ class GetRecipeIngredientSerializer(serializers.ModelSerializer):
         read_only_fields = fields
 
 
+class RecipeListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        recipes = data.all() if isinstance(data, Manager) else data
+        return self.child.render_many(list(recipes))
+
+
 class GetRecipeSerializer(serializers.ModelSerializer):
     image = Base64ImageField()
     tags = TagSerializer(many=True)
@@ -156,58 +325,143 @@ class GetRecipeSerializer(serializers.ModelSerializer):
     )
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
+    image_renditions = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
         fields = ('id', 'tags', 'author', 'ingredients', 'is_favorited',
-                  'is_in_shopping_cart', 'name', 'image', 'text',
-                  'cooking_time')
+                  'is_in_shopping_cart', 'name', 'image', 'image_renditions',
+                  'text', 'cooking_time')
         read_only_fields = fields
+        list_serializer_class = RecipeListSerializer
+
+    def to_representation(self, recipe):
+        return self.render_many([recipe])[0]
+
+    def render_many(self, recipes):
+        shared = recipe_cache.get_many(recipes)
+        missing = [recipe for recipe in recipes if recipe.id not in shared]
+        if missing:
+            # Связанные объекты нужны только рецептам, которых нет в кэше.
+            prefetch_related_objects(
+                missing, 'tags', recipe_ingredients_prefetch()
+            )
+            rendered = {
+                recipe.id: self._shared_representation(recipe)
+                for recipe in missing
+            }
+            recipe_cache.set_many(missing, rendered)
+            shared.update(rendered)
+        return [
+            self._personal_representation(shared[recipe.id], recipe)
+            for recipe in recipes
+        ]
+
+    def _shared_representation(self, recipe):
+        data = super().to_representation(recipe)
+        data['image'] = recipe.image.url
+        data['author']['avatar'] = (
+            recipe.author.avatar.url if recipe.author.avatar else None
+        )
+        return data
+
+    def _personal_representation(self, shared, recipe):
+        build_absolute_uri = self.context['request'].build_absolute_uri
+        author = dict(
+            shared['author'],
+            is_subscribed=self.fields['author'].get_is_subscribed(
+                recipe.author
+            )
+        )
+        if author['avatar']:
+            author['avatar'] = build_absolute_uri(author['avatar'])
+        data = dict(
+            shared,
+            author=author,
+            image=build_absolute_uri(shared['image']),
+            image_renditions=absolute_rendition_urls(
+                self.context['request'], shared['image_renditions']
+            ),
+            is_favorited=self.get_is_favorited(recipe),
+            is_in_shopping_cart=self.get_is_in_shopping_cart(recipe)
+        )
+        return OrderedDict((field, data[field]) for field in self.Meta.fields)
 
     @staticmethod
-    def _check_object_exists(context, recipe, model):
+    def _check_object_exists(context, recipe, model, annotation):
+        annotated = getattr(recipe, annotation, None)
+        if annotated is not None:
+            return annotated
         user = context['request'].user
         return (
             user.is_authenticated
             and model.objects.filter(user=user, recipe=recipe).exists()
         )
 
+    @staticmethod
+    def get_image_renditions(recipe):
+        return rendition_urls(recipe.image.name)
+
     def get_is_favorited(self, recipe):
-        return self._check_object_exists(self.context, recipe, Favorite)
+        return self._check_object_exists(self.context, recipe, Favorite,
+                                         'is_favorited')
 
     def get_is_in_shopping_cart(self, recipe):
-        return self._check_object_exists(self.context, recipe, ShoppingCart)
+        return self._check_object_exists(self.context, recipe, ShoppingCart,
+                                         'is_in_shopping_cart')
 
 
 class RecipeShortSerializer(serializers.ModelSerializer):
     image = Base64ImageField()
+    image_renditions = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_renditions', 'cooking_time')
+
+    def get_image_renditions(self, recipe):
+        return absolute_rendition_urls(
+            self.context.get('request'), rendition_urls(recipe.image.name)
+        )
+
+    def to_representation(self, recipe):
+        data = super().to_representation(recipe)
+        # В карточке достаточно уменьшенной копии вместо оригинала.
+        renditions = data['image_renditions']
+        if renditions:
+            data['image'] = renditions[Config.IMAGE_CARD_RENDITION]['jpg']
+        return data
+
+
+class SubscriptionsListListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        authors = list(data.all() if isinstance(data, Manager) else data)
+        # Пустая страница: id__in=[] не строит SQL для подзапроса рецептов.
+        if authors:
+            prefetch_related_objects(authors, latest_recipes_prefetch(
+                [author.id for author in authors],
+                recipes_limit(self.context['request'])
+            ))
+        return super().to_representation(authors)
 
 
 class SubscriptionsListSerializer(FoodGramUserSerializer):
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.IntegerField(default=0)
 
     class Meta(FoodGramUserSerializer.Meta):
         fields = FoodGramUserSerializer.Meta.fields + (
             'recipes', 'recipes_count'
         )
         read_only_fields = fields
+        list_serializer_class = SubscriptionsListListSerializer
 
     def get_recipes(self, user):
-        recipes = user.recipes.all()
-        recipes_limit = self.context['request'].query_params.get(
-            'recipes_limit')
-        if recipes_limit:
-            try:
-                recipes = recipes[:int(recipes_limit)]
-            except ValueError:
-                pass
+        if not hasattr(user, 'latest_recipes'):
+            prefetch_related_objects([user], latest_recipes_prefetch(
+                [user.id], recipes_limit(self.context['request'])
+            ))
         return RecipeShortSerializer(
-            recipes, many=True, context=self.context
+            user.latest_recipes, many=True, context=self.context
         ).data
 
 
@@ -215,12 +469,6 @@ class SubscriptionSerializer(serializers.ModelSerializer):
     class Meta:
         model = Subscription
         fields = ('user', 'author')
-        validators = [
-            serializers.UniqueTogetherValidator(
-                queryset=Subscription.objects.all(),
-                fields=('user', 'author')
-            ),
-        ]
 
     def validate(self, data):
         if data['user'] == data['author']:
@@ -229,26 +477,39 @@ class SubscriptionSerializer(serializers.ModelSerializer):
             )
         return data
 
+    def create(self, validated_data):
+        return create_if_absent(
+            Subscription, Error.ALREADY_SUBSCRIBED, **validated_data
+        )
+
     def to_representation(self, instance):
         return SubscriptionsListSerializer(instance.author,
                                            context=self.context).data
 
 
+class RecipeIdsSerializer(serializers.Serializer):
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=Config.BULK_RECIPES_MAX_LENGTH
+    )
+
+    @staticmethod
+    def validate_recipes(recipes):
+        return list(dict.fromkeys(recipes))
+
+
 class ShoppingCartFavoriteBaseSerializer(serializers.ModelSerializer):
     class Meta:
         model = None
         fields = ('user', 'recipe')
 
-    def validate(self, data):
+    def create(self, validated_data):
         model = self.Meta.model
-        if model.objects.filter(
-                user=data['user'],
-                recipe=data['recipe']
-        ).exists():
-            raise serializers.ValidationError(
-                Error.ALREADY_ADDED.format(model.__name__)
-            )
-        return data
+        return create_if_absent(
+            model, Error.ALREADY_ADDED.format(model.__name__),
+            **validated_data
+        )
 
     def to_representation(self, instance):
         return RecipeShortSerializer(instance.recipe).data
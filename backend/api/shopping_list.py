@@ -0,0 +1,212 @@
+import csv
+import os
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+from django.http import FileResponse, StreamingHttpResponse
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+from api.constants import Config
+from recipes.models import RecipeIngredient, ShoppingCart, ShoppingListItem
+
+User = get_user_model()
+
+
+def _apply_deltas(user_ids, deltas):
+    # Вызывается внутри транзакции: строки пользователей блокируются,
+    # чтобы параллельные изменения одного списка не создали дубликаты.
+    deltas = {
+        ingredient_id: delta
+        for ingredient_id, delta in deltas.items() if delta
+    }
+    if not user_ids or not deltas:
+        return
+    list(
+        User.objects.select_for_update().filter(id__in=user_ids)
+        .order_by('id').values_list('id', flat=True)
+    )
+    items = ShoppingListItem.objects.filter(
+        user_id__in=user_ids, ingredient_id__in=deltas
+    )
+    existing = set(items.values_list('user_id', 'ingredient_id'))
+    items.update(total_amount=F('total_amount') + Case(
+        *(
+            When(ingredient_id=ingredient_id, then=Value(delta))
+            for ingredient_id, delta in deltas.items()
+        ),
+        output_field=IntegerField()
+    ))
+    ShoppingListItem.objects.bulk_create(
+        ShoppingListItem(
+            user_id=user_id, ingredient_id=ingredient_id, total_amount=delta
+        )
+        for user_id in user_ids
+        for ingredient_id, delta in deltas.items()
+        if delta > 0 and (user_id, ingredient_id) not in existing
+    )
+    ShoppingListItem.objects.filter(
+        user_id__in=user_ids, total_amount__lte=0
+    ).delete()
+
+
+def change_shopping_list(user_id, recipe_ids, sign):
+    amounts = (
+        RecipeIngredient.objects.filter(recipe_id__in=recipe_ids)
+        .values('ingredient_id')
+        .annotate(total_amount=Sum('amount'))
+        .order_by()
+        .values_list('ingredient_id', 'total_amount')
+    )
+    _apply_deltas(
+        (user_id,),
+        {ingredient_id: sign * amount for ingredient_id, amount in amounts}
+    )
+
+
+def add_to_shopping_list(user_id, recipe_id):
+    change_shopping_list(user_id, (recipe_id,), 1)
+
+
+def remove_from_shopping_list(user_id, recipe_id):
+    change_shopping_list(user_id, (recipe_id,), -1)
+
+
+def recipe_ingredients_changed(recipe_id, old_amounts, new_amounts):
+    _apply_deltas(
+        list(
+            ShoppingCart.objects.filter(recipe_id=recipe_id)
+            .values_list('user_id', flat=True)
+        ),
+        {
+            ingredient_id: (
+                new_amounts.get(ingredient_id, 0)
+                - old_amounts.get(ingredient_id, 0)
+            )
+            for ingredient_id in {*old_amounts, *new_amounts}
+        }
+    )
+
+
+def calculate_shopping_list(user_id):
+    return dict(
+        RecipeIngredient.objects.filter(recipe__shoppingcart__user=user_id)
+        .values('ingredient')
+        .annotate(total_amount=Sum('amount'))
+        .order_by()
+        .values_list('ingredient', 'total_amount')
+    )
+
+
+def shopping_cart_rows(user):
+    return (
+        ShoppingListItem.objects.filter(user=user)
+        .order_by('ingredient__name')
+        .values_list(
+            'ingredient__name', 'ingredient__measurement_unit',
+            'total_amount'
+        )
+        .iterator(chunk_size=Config.SHOPPING_LIST_CHUNK_SIZE)
+    )
+
+
+def _attachment(response, extension):
+    response['Content-Disposition'] = (
+        f'attachment; filename="{Config.SHOPPING_LIST_FILENAME}.{extension}"'
+    )
+    return response
+
+
+def _text_lines(rows):
+    for name, measurement_unit, amount in rows:
+        yield f'{name}, {measurement_unit}: {amount}\n'.encode()
+
+
+class _Echo:
+    @staticmethod
+    def write(value):
+        return value
+
+
+def _csv_lines(rows):
+    writer = csv.writer(_Echo())
+    yield '\ufeff'.encode()
+    yield writer.writerow(Config.SHOPPING_LIST_CSV_HEADER).encode()
+    for row in rows:
+        yield writer.writerow(row).encode()
+
+
+def _pdf_font():
+    # Встроенные шрифты PDF не содержат кириллицы: без TTF-шрифта
+    # названия ингредиентов превратились бы в нечитаемые символы.
+    if Config.SHOPPING_LIST_PDF_FONT in pdfmetrics.getRegisteredFontNames():
+        return Config.SHOPPING_LIST_PDF_FONT
+    if not os.path.exists(settings.SHOPPING_LIST_PDF_FONT_PATH):
+        raise ImproperlyConfigured(
+            f'Шрифт для PDF не найден: {settings.SHOPPING_LIST_PDF_FONT_PATH}.'
+            f' Установите fonts-dejavu-core или задайте'
+            f' SHOPPING_LIST_PDF_FONT_PATH'
+        )
+    pdfmetrics.registerFont(TTFont(
+        Config.SHOPPING_LIST_PDF_FONT, settings.SHOPPING_LIST_PDF_FONT_PATH
+    ))
+    return Config.SHOPPING_LIST_PDF_FONT
+
+
+def _pdf_file(rows):
+    # PDF рисуется построчно во временный файл, который уходит на диск
+    # после SHOPPING_LIST_SPOOL_SIZE байт, и отдаётся частями.
+    file = SpooledTemporaryFile(max_size=Config.SHOPPING_LIST_SPOOL_SIZE)
+    pdf = canvas.Canvas(file, pagesize=A4, pageCompression=1)
+    font = _pdf_font()
+    _, height = A4
+    margin = Config.SHOPPING_LIST_PDF_MARGIN
+    lines_per_page = int(
+        (height - 2 * margin) // Config.SHOPPING_LIST_PDF_LINE_HEIGHT
+    )
+    text = None
+    for number, (name, measurement_unit, amount) in enumerate(rows):
+        if number % lines_per_page == 0:
+            if text is not None:
+                pdf.drawText(text)
+                pdf.showPage()
+            text = pdf.beginText(margin, height - margin)
+            text.setFont(
+                font, Config.SHOPPING_LIST_PDF_FONT_SIZE,
+                Config.SHOPPING_LIST_PDF_LINE_HEIGHT
+            )
+        text.textLine(f'{name}, {measurement_unit}: {amount}')
+    if text is not None:
+        pdf.drawText(text)
+    pdf.save()
+    file.seek(0)
+    return file
+
+
+def shopping_cart_response(user, file_format):
+    rows = shopping_cart_rows(user)
+    if file_format == 'pdf':
+        return FileResponse(
+            _pdf_file(rows),
+            as_attachment=True,
+            filename=f'{Config.SHOPPING_LIST_FILENAME}.pdf',
+            content_type='application/pdf'
+        )
+    if file_format == 'csv':
+        return _attachment(
+            StreamingHttpResponse(
+                _csv_lines(rows), content_type='text/csv; charset=utf-8'
+            ),
+            'csv'
+        )
+    return _attachment(
+        StreamingHttpResponse(
+            _text_lines(rows), content_type='text/plain; charset=utf-8'
+        ),
+        'txt'
+    )
@@ -0,0 +1,103 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+
+from api.autocomplete import ingredient_index
+from api.cache import change_versions, recipe_cache
+from api.shopping_list import add_to_shopping_list, remove_from_shopping_list
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, Tag)
+from recipes.renditions import renditions_ready
+from users.models import Subscription
+
+User = get_user_model()
+
+
+def recipes_changed(recipe_ids):
+    recipe_cache.invalidate(recipe_ids)
+    change_versions.bump('recipes')
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def recipe_changed(sender, instance, **kwargs):
+    recipes_changed((instance.id,))
+
+
+@receiver(renditions_ready)
+def recipe_renditions_ready(sender, name, **kwargs):
+    recipes_changed(
+        Recipe.objects.filter(image=name).values_list('id', flat=True)
+    )
+
+
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+def recipe_ingredient_changed(sender, instance, **kwargs):
+    recipes_changed((instance.recipe_id,))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=RecipeIngredient)
+def recipe_relations_changed(sender, instance, action, reverse, pk_set,
+                             **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            recipes_changed((instance.id,))
+    elif action in ('post_add', 'post_remove'):
+        recipes_changed(pk_set)
+    elif action == 'pre_clear':
+        recipes_changed(
+            sender.objects.filter(
+                **{instance._meta.model_name: instance}
+            ).values_list('recipe_id', flat=True)
+        )
+
+
+@receiver((post_save, pre_delete), sender=Tag)
+def tag_changed(sender, instance, **kwargs):
+    change_versions.bump('tags')
+    recipes_changed(instance.recipes.values_list('id', flat=True))
+
+
+@receiver((post_save, pre_delete), sender=Ingredient)
+def ingredient_changed(sender, instance, **kwargs):
+    change_versions.bump('ingredients')
+    recipes_changed(
+        instance.recipeingredient_set.values_list('recipe_id', flat=True)
+    )
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_saved(sender, instance, **kwargs):
+    ingredient_index.changed(instance)
+
+
+@receiver(post_delete, sender=Ingredient)
+def ingredient_deleted(sender, instance, **kwargs):
+    ingredient_index.changed(instance, deleted=True)
+
+
+@receiver(post_save, sender=User)
+def author_changed(sender, instance, created, update_fields, **kwargs):
+    if created or (update_fields and set(update_fields) <= {'last_login'}):
+        return
+    recipes_changed(instance.recipes.values_list('id', flat=True))
+
+
+@receiver((post_save, post_delete), sender=Favorite)
+@receiver((post_save, post_delete), sender=ShoppingCart)
+@receiver((post_save, post_delete), sender=Subscription)
+def user_flags_changed(sender, instance, **kwargs):
+    change_versions.bump(f'user:{instance.user_id}')
+
+
+@receiver(post_save, sender=ShoppingCart)
+def shopping_cart_added(sender, instance, created, **kwargs):
+    if created:
+        add_to_shopping_list(instance.user_id, instance.recipe_id)
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def shopping_cart_removed(sender, instance, **kwargs):
+    # pre_delete приходит до каскадного удаления ингредиентов рецепта.
+    remove_from_shopping_list(instance.user_id, instance.recipe_id)
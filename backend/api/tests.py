@@ -0,0 +1,489 @@
+import io
+import shutil
+import tempfile
+import threading
+from unittest import mock, skipUnless
+
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import IntegrityError, connection
+from django.db.models import F
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APIClient
+
+from api import shopping_list
+from api.core import create_if_absent
+from recipes.models import (ChangeVersion, Favorite, Ingredient, Recipe,
+                            RecipeIngredient, ShoppingCart, ShoppingListItem,
+                            Tag)
+from users.models import Subscription
+
+User = get_user_model()
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def make_user(number):
+    return User.objects.create_user(
+        email=f'user{number}@example.com', username=f'user{number}',
+        first_name='Имя', last_name='Фамилия', password='password-123'
+    )
+
+
+def make_recipe(author, name):
+    buffer = io.BytesIO()
+    Image.new('RGB', (4, 4), 'red').save(buffer, 'PNG')
+    return Recipe.objects.create(
+        author=author, name=name, text='Описание', cooking_time=5,
+        image=SimpleUploadedFile('recipe.png', buffer.getvalue())
+    )
+
+
+def tearDownModule():
+    shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+
+media_settings = override_settings(
+    MEDIA_ROOT=MEDIA_ROOT, IMAGE_RENDITION_WORKERS=0
+)
+
+
+@media_settings
+class CreateIfAbsentTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user(1)
+        cls.recipe = make_recipe(cls.user, 'Рецепт')
+
+    def test_duplicate_is_validation_error(self):
+        create_if_absent(Favorite, 'уже', user=self.user, recipe=self.recipe)
+        with self.assertRaises(ValidationError):
+            create_if_absent(
+                Favorite, 'уже', user=self.user, recipe=self.recipe
+            )
+
+    def test_other_integrity_errors_are_not_duplicates(self):
+        with self.assertRaises(IntegrityError):
+            create_if_absent(Favorite, 'уже', user=self.user, recipe=None)
+
+
+@media_settings
+class RecipeTagFilterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = make_user(1)
+        breakfast, lunch, dinner = (
+            Tag.objects.create(name=name, slug=slug)
+            for name, slug in (
+                ('завтрак', 'breakfast'), ('обед', 'lunch'),
+                ('ужин', 'dinner')
+            )
+        )
+        cls.both = make_recipe(author, 'Оба тега')
+        cls.both.tags.set((breakfast, lunch))
+        cls.one = make_recipe(author, 'Один тег')
+        cls.one.tags.set((breakfast,))
+        make_recipe(author, 'Другой тег').tags.set((dinner,))
+
+    def test_recipe_with_several_matching_tags_is_listed_once(self):
+        response = self.client.get(
+            '/api/recipes/', {'tags': ['breakfast', 'lunch'], 'limit': 10}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual(
+            sorted(recipe['id'] for recipe in response.data['results']),
+            sorted((self.both.id, self.one.id))
+        )
+
+
+@media_settings
+@override_settings(RECIPE_CACHE_ENABLED=False)
+class RecipeListQueryCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user(1)
+        tag = Tag.objects.create(name='завтрак', slug='breakfast')
+        ingredient = Ingredient.objects.create(
+            name='мука', measurement_unit='г'
+        )
+        for number in range(8):
+            recipe = make_recipe(cls.user, f'Рецепт {number}')
+            recipe.tags.set((tag,))
+            RecipeIngredient.objects.create(
+                recipe=recipe, ingredient=ingredient, amount=100
+            )
+            Favorite.objects.create(user=cls.user, recipe=recipe)
+            ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+
+    def _queries(self, client, limit):
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get('/api/recipes/', {'limit': limit})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), limit)
+        return len(queries)
+
+    def _assert_constant(self, client):
+        # Первый запрос создаёт строки версий данных, он не считается.
+        self._queries(client, 2)
+        self.assertEqual(self._queries(client, 2), self._queries(client, 8))
+
+    def test_anonymous_list(self):
+        self._assert_constant(APIClient())
+
+    def test_authenticated_list(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self._assert_constant(client)
+
+
+@media_settings
+@override_settings(RECIPE_CACHE_ENABLED=False)
+class RecipeIngredientsQueryCountTests(TestCase):
+    INGREDIENTS = 25
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.recipe = make_recipe(make_user(1), 'Рецепт')
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'ингредиент {number}', measurement_unit='г')
+            for number in range(cls.INGREDIENTS)
+        )
+        cls.ingredients = list(Ingredient.objects.order_by('id'))
+        RecipeIngredient.objects.create(
+            recipe=cls.recipe, ingredient=cls.ingredients[0], amount=1
+        )
+
+    def _queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response
+
+    def _assert_constant(self, url, ingredients):
+        # Первый запрос создаёт строки версий данных, он не считается.
+        self._queries(url)
+        one, _ = self._queries(url)
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=self.recipe, ingredient=ingredient,
+                             amount=1)
+            for ingredient in self.ingredients[1:]
+        )
+        many, response = self._queries(url)
+        self.assertEqual(len(ingredients(response.data)), self.INGREDIENTS)
+        self.assertEqual(one, many)
+
+    def test_list(self):
+        self._assert_constant(
+            '/api/recipes/', lambda data: data['results'][0]['ingredients']
+        )
+
+    def test_retrieve(self):
+        self._assert_constant(
+            f'/api/recipes/{self.recipe.id}/',
+            lambda data: data['ingredients']
+        )
+
+
+@media_settings
+class AdminChangelistQueryCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            email='admin@example.com', username='admin',
+            first_name='Имя', last_name='Фамилия', password='password-123'
+        )
+        tag = Tag.objects.create(name='завтрак', slug='breakfast')
+        ingredient = Ingredient.objects.create(
+            name='мука', measurement_unit='г'
+        )
+        for number in range(8):
+            recipe = make_recipe(make_user(number), f'Рецепт {number}')
+            recipe.tags.set((tag,))
+            RecipeIngredient.objects.create(
+                recipe=recipe, ingredient=ingredient, amount=100
+            )
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def _queries(self, model, url, per_page):
+        with mock.patch.object(
+            admin.site._registry[model], 'list_per_page', per_page
+        ), CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            len(response.context['cl'].result_list), per_page
+        )
+        return len(queries)
+
+    def _assert_constant(self, model, url):
+        self.assertEqual(
+            self._queries(model, url, 2), self._queries(model, url, 8)
+        )
+
+    def test_recipe_changelist(self):
+        self._assert_constant(Recipe, '/admin/recipes/recipe/')
+
+    def test_user_changelist(self):
+        self._assert_constant(User, '/admin/users/foodgramuser/')
+
+
+@media_settings
+class CounterReassignTests(TestCase):
+    def test_changing_recipe_author_moves_recipes_count(self):
+        old_author, new_author = make_user(1), make_user(2)
+        recipe = make_recipe(old_author, 'Рецепт')
+        recipe.author = new_author
+        recipe.save()
+        old_author.refresh_from_db()
+        new_author.refresh_from_db()
+        self.assertEqual(
+            (old_author.recipes_count, new_author.recipes_count), (0, 1)
+        )
+
+    def test_changing_favorite_recipe_moves_favorites_count(self):
+        user = make_user(1)
+        old_recipe = make_recipe(user, 'Старый')
+        new_recipe = make_recipe(user, 'Новый')
+        favorite = Favorite.objects.create(user=user, recipe=old_recipe)
+        favorite.recipe = new_recipe
+        favorite.save()
+        old_recipe.refresh_from_db()
+        new_recipe.refresh_from_db()
+        self.assertEqual(
+            (old_recipe.favorites_count, new_recipe.favorites_count), (0, 1)
+        )
+
+
+class ShoppingListPdfFontTests(TestCase):
+    @override_settings(SHOPPING_LIST_PDF_FONT_PATH='/nonexistent/font.ttf')
+    def test_missing_font_is_an_error(self):
+        with mock.patch.object(
+            shopping_list.Config, 'SHOPPING_LIST_PDF_FONT', 'MissingFont'
+        ), self.assertRaises(ImproperlyConfigured):
+            shopping_list._pdf_font()
+
+
+class CatalogueVersionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Tag.objects.create(name='завтрак', slug='breakfast')
+        Ingredient.objects.create(name='мука', measurement_unit='г')
+
+    def _version_reads(self, url, **headers):
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, **headers)
+        self.assertEqual(response.status_code, 200)
+        return sum(
+            ChangeVersion._meta.db_table in query['sql']
+            for query in queries.captured_queries
+        )
+
+    def test_tags_read_versions_once(self):
+        self.assertEqual(self._version_reads(
+            '/api/tags/', HTTP_ACCEPT_ENCODING='gzip'
+        ), 1)
+
+    def test_ingredient_search_reads_versions_once(self):
+        self.assertEqual(
+            self._version_reads('/api/ingredients/?name=му'), 1
+        )
+
+    def test_etag_is_weak_for_gzip_and_identity(self):
+        plain = self.client.get('/api/tags/')
+        gzipped = self.client.get(
+            '/api/tags/', HTTP_ACCEPT_ENCODING='gzip'
+        )
+        self.assertEqual(gzipped['Content-Encoding'], 'gzip')
+        self.assertTrue(plain['ETag'].startswith('W/'))
+        self.assertEqual(
+            self.client.get(
+                '/api/tags/', HTTP_IF_NONE_MATCH=plain['ETag']
+            ).status_code,
+            304
+        )
+
+
+@media_settings
+class SubscriptionsListTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user(1)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_empty_page_with_recipes_limit(self):
+        response = self.client.get(
+            '/api/users/subscriptions/',
+            {'page': 1, 'limit': 6, 'recipes_limit': 3}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'], [])
+
+
+@media_settings
+class RecipeCursorPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = make_user(1)
+        for number in range(7):
+            make_recipe(author, f'Рецепт {number}')
+        # Одинаковое время добавления у всех, кроме одного рецепта:
+        # порядок внутри группы задаёт id.
+        Recipe.objects.exclude(name='Рецепт 6').update(
+            add_time=Recipe.objects.get(name='Рецепт 0').add_time
+        )
+        cls.expected = list(Recipe.objects.order_by(
+            F('add_time').desc(), F('id').desc()
+        ).values_list('id', flat=True))
+
+    def _ids(self, response):
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.data['results']]
+
+    def test_pages_follow_add_time_and_id(self):
+        ids = []
+        url = '/api/recipes/?cursor=&limit=3'
+        with CaptureQueriesContext(connection) as queries:
+            while url:
+                response = self.client.get(url)
+                ids += self._ids(response)
+                url = response.data['next']
+        self.assertEqual(ids, self.expected)
+        self.assertFalse(any(
+            'OFFSET' in query['sql'].upper()
+            for query in queries.captured_queries
+        ))
+
+    def test_first_page_has_no_previous_link(self):
+        response = self.client.get('/api/recipes/?cursor=&limit=3')
+        self.assertIsNone(response.data['previous'])
+
+    def test_empty_page_links_stay_in_cursor_mode(self):
+        first = self.client.get('/api/recipes/?cursor=&limit=3')
+        second = self.client.get(first.data['next'])
+        # Всё, что было до первой страницы, удалено.
+        Recipe.objects.filter(id__in=self._ids(first)).delete()
+        empty = self.client.get(second.data['previous'])
+        self.assertEqual(self._ids(empty), [])
+        self.assertIn('cursor=', empty.data['next'])
+        self.assertEqual(
+            self._ids(self.client.get(empty.data['next'])),
+            self.expected[3:6]
+        )
+
+    def test_previous_link_returns_previous_page(self):
+        first = self.client.get('/api/recipes/?cursor=&limit=3')
+        second = self.client.get(first.data['next'])
+        previous = self.client.get(second.data['previous'])
+        self.assertEqual(self._ids(second), self.expected[3:6])
+        self.assertEqual(self._ids(previous), self.expected[:3])
+
+    def test_invalid_cursor_is_not_found(self):
+        response = self.client.get('/api/recipes/?cursor=invalid')
+        self.assertEqual(response.status_code, 404)
+
+
+@media_settings
+@skipUnless(
+    connection.vendor == 'postgresql',
+    'Параллельные транзакции проверяются только на PostgreSQL'
+)
+class ConcurrentCreateTests(TransactionTestCase):
+    THREADS = 8
+
+    def setUp(self):
+        self.user = make_user(1)
+        self.author = make_user(2)
+        self.recipe = make_recipe(self.author, 'Рецепт')
+        ingredient = Ingredient.objects.create(
+            name='мука', measurement_unit='г'
+        )
+        RecipeIngredient.objects.create(
+            recipe=self.recipe, ingredient=ingredient, amount=100
+        )
+
+    def _parallel(self, *requests):
+        # Все потоки стартуют одновременно, у каждого своё соединение.
+        requests = requests * (self.THREADS // len(requests))
+        barrier = threading.Barrier(len(requests))
+        statuses = []
+
+        def worker(request):
+            client = APIClient()
+            client.force_authenticate(self.user)
+            try:
+                barrier.wait()
+                statuses.append(request(client).status_code)
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=worker, args=(request,))
+            for request in requests
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return sorted(statuses)
+
+    def test_parallel_favorite(self):
+        statuses = self._parallel(lambda client: client.post(
+            f'/api/recipes/{self.recipe.id}/favorite/'
+        ))
+        self.assertEqual(statuses, [201] + [400] * (self.THREADS - 1))
+        self.assertEqual(Favorite.objects.count(), 1)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 1)
+
+    def test_parallel_shopping_cart(self):
+        statuses = self._parallel(lambda client: client.post(
+            f'/api/recipes/{self.recipe.id}/shopping_cart/'
+        ))
+        self.assertEqual(statuses, [201] + [400] * (self.THREADS - 1))
+        self.assertEqual(ShoppingCart.objects.count(), 1)
+        self.assertEqual(
+            list(ShoppingListItem.objects.values_list(
+                'user_id', 'total_amount'
+            )),
+            [(self.user.id, 100)]
+        )
+
+    def test_parallel_single_and_bulk_shopping_cart(self):
+        # Одиночные и массовые добавления берут одну блокировку
+        # пользователя и не взаимоблокируются.
+        statuses = self._parallel(
+            lambda client: client.post(
+                f'/api/recipes/{self.recipe.id}/shopping_cart/'
+            ),
+            lambda client: client.post(
+                '/api/recipes/shopping_cart/',
+                {'recipes': [self.recipe.id]}, format='json'
+            ),
+        )
+        self.assertNotIn(500, statuses)
+        self.assertEqual(ShoppingCart.objects.count(), 1)
+        self.assertEqual(
+            list(ShoppingListItem.objects.values_list('total_amount')),
+            [(100,)]
+        )
+
+    def test_parallel_subscribe(self):
+        statuses = self._parallel(lambda client: client.post(
+            f'/api/users/{self.author.id}/subscribe/'
+        ))
+        self.assertEqual(statuses, [201] + [400] * (self.THREADS - 1))
+        self.assertEqual(Subscription.objects.count(), 1)
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.subscribers_count, 1)
@@ -1,7 +1,7 @@
 from django.contrib.auth import get_user_model
-from django.db.models import Count, Sum
-from django.http import FileResponse
+from django.db.models import BooleanField, Exists, OuterRef, Value
 from django.urls import reverse
+from django.utils.decorators import method_decorator
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
 from rest_framework import status
@@ -11,27 +11,39 @@ from rest_framework.pagination import LimitOffsetPagination
 from rest_framework.permissions import (AllowAny, IsAuthenticated,
                                         IsAuthenticatedOrReadOnly)
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from rest_framework.viewsets import ModelViewSet, ReadOnlyModelViewSet
 
-from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
-                            ShoppingCart, Tag)
+from recipes.core import short_link_code
+from recipes.models import Favorite, Ingredient, Recipe, ShoppingCart, Tag
 from users.models import Subscription
-from .core import add_object, delete_object, shopping_cart_data
-from .filters import IngredientFilter, RecipeFilter
-from .pagination import PageNumberPaginator
+
+from .autocomplete import ingredient_index
+from .catalogue import CatalogueListMixin, CatalogueSnapshot
+from .conditional import condition_on_versions
+from .constants import Config
+from .core import add_object, add_objects, delete_object, delete_objects
+from .filters import RecipeFilter
+from .pagination import (CursorPaginationMixin, PageNumberPaginator,
+                         RecipeCursorPaginator, UserCursorPaginator)
 from .permissions import OwnerAdminOrReadOnly
+from .renderers import (CSVShoppingListRenderer, PDFShoppingListRenderer,
+                        TextShoppingListRenderer)
 from .serializers import (AvatarSerializer, FavoriteSerializer,
                           FoodGramUserSerializer, IngredientSerializer,
-                          GetRecipeSerializer, UpdateCreateRecipeSerializer,
+                          GetRecipeSerializer, RecipeIdsSerializer,
+                          UpdateCreateRecipeSerializer,
                           ShoppingCartSerializer, SubscriptionSerializer,
                           SubscriptionsListSerializer, TagSerializer)
+from .shopping_list import shopping_cart_response
 
 User = get_user_model()
 
 
-class UserFoodgramViewSet(UserViewSet):
+class UserFoodgramViewSet(CursorPaginationMixin, UserViewSet):
     queryset = User.objects.all()
     pagination_class = LimitOffsetPagination
+    cursor_pagination_class = UserCursorPaginator
     filter_backends = (DjangoFilterBackend,)
 
     @action(detail=False, url_path='me', permission_classes=(IsAuthenticated,))
@@ -55,7 +67,10 @@ class UserFoodgramViewSet(UserViewSet):
     def delete_avatar(self, request):
         user = request.user
         if user.avatar:
-            user.avatar.delete()
+            # Файл может быть общим с другими загрузками,
+            # его удалит collect_media, когда ссылок не останется.
+            user.avatar = None
+            user.save(update_fields=('avatar',))
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(
@@ -65,14 +80,12 @@ class UserFoodgramViewSet(UserViewSet):
         permission_classes=(OwnerAdminOrReadOnly,)
     )
     def subscriptions(self, request):
-        subscriptions = (
-            User.objects.filter(subs_from_user__user=request.user)
-            .annotate(recipes_count=Count('recipes'))
+        subscriptions = User.objects.filter(
+            subs_from_user__user=request.user
         )
-        paginator = self.pagination_class()
-        result_page = paginator.paginate_queryset(subscriptions, request)
+        result_page = self.paginate_queryset(subscriptions)
         serializer = self.get_serializer(result_page, many=True)
-        return paginator.get_paginated_response(serializer.data)
+        return self.get_paginated_response(serializer.data)
 
     @action(detail=True, methods=('post',), url_path='subscribe',
             serializer_class=SubscriptionSerializer,
@@ -101,32 +114,65 @@ class UserFoodgramViewSet(UserViewSet):
         )
 
 
-class TagViewSet(ReadOnlyModelViewSet):
+@method_decorator(condition_on_versions('tags'), name='list')
+@method_decorator(condition_on_versions('tags'), name='retrieve')
+class TagViewSet(CatalogueListMixin, ReadOnlyModelViewSet):
     serializer_class = TagSerializer
     queryset = Tag.objects.all()
     pagination_class = None
+    catalogue = CatalogueSnapshot('tags')
 
 
-class IngredientViewSet(ReadOnlyModelViewSet):
+@method_decorator(
+    condition_on_versions('ingredients', Config.INGREDIENT_INDEX_SCOPE),
+    name='list'
+)
+@method_decorator(condition_on_versions('ingredients'), name='retrieve')
+class IngredientViewSet(CatalogueListMixin, ReadOnlyModelViewSet):
     serializer_class = IngredientSerializer
     queryset = Ingredient.objects.all()
-    filter_backends = (DjangoFilterBackend,)
-    filterset_class = IngredientFilter
     pagination_class = None
-
-
-class RecipeViewSet(ModelViewSet):
-    queryset = (
-        Recipe.objects.select_related('author')
-        .prefetch_related('tags', 'ingredients')
-        .all()
-    )
+    catalogue = CatalogueSnapshot('ingredients')
+
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if not name:
+            return super().list(request, *args, **kwargs)
+        limit = request.query_params.get('limit', '')
+        return Response(ingredient_index.search(
+            name, int(limit) if limit.isdigit() else None, request=request
+        ))
+
+
+@method_decorator(condition_on_versions('recipes', personal=True),
+                  name='list')
+@method_decorator(condition_on_versions('recipes', personal=True),
+                  name='retrieve')
+class RecipeViewSet(CursorPaginationMixin, ModelViewSet):
+    queryset = Recipe.objects.select_related('author').all()
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
     permission_classes = (OwnerAdminOrReadOnly,)
     pagination_class = PageNumberPaginator
+    cursor_pagination_class = RecipeCursorPaginator
     http_method_names = ('get', 'post', 'patch', 'delete')
 
+    def get_queryset(self):
+        user = self.request.user
+        if not user.is_authenticated:
+            return self.queryset.annotate(
+                is_favorited=Value(False, output_field=BooleanField()),
+                is_in_shopping_cart=Value(False, output_field=BooleanField())
+            )
+        return self.queryset.annotate(
+            is_favorited=Exists(
+                Favorite.objects.filter(user=user, recipe=OuterRef('pk'))
+            ),
+            is_in_shopping_cart=Exists(
+                ShoppingCart.objects.filter(user=user, recipe=OuterRef('pk'))
+            )
+        )
+
     def get_serializer_class(self, *args, **kwargs):
         if self.action in ('list', 'retrieve'):
             return GetRecipeSerializer
@@ -150,26 +196,42 @@ class RecipeViewSet(ModelViewSet):
     def delete_shopping_cart(self, request, pk=None):
         return delete_object(request, pk, ShoppingCart)
 
-    @action(detail=False, methods=('get',), url_path='download_shopping_cart',
+    @action(detail=False, methods=('post',), url_path='favorite',
             permission_classes=(IsAuthenticated,))
+    def favorites(self, request):
+        return add_objects(request, Favorite, RecipeIdsSerializer)
+
+    @favorites.mapping.delete
+    def delete_favorites(self, request):
+        return delete_objects(request, Favorite, RecipeIdsSerializer)
+
+    @action(detail=False, methods=('post',), url_path='shopping_cart',
+            permission_classes=(IsAuthenticated,))
+    def shopping_carts(self, request):
+        return add_objects(request, ShoppingCart, RecipeIdsSerializer)
+
+    @shopping_carts.mapping.delete
+    def delete_shopping_carts(self, request):
+        return delete_objects(request, ShoppingCart, RecipeIdsSerializer)
+
+    @action(detail=False, methods=('get',), url_path='download_shopping_cart',
+            permission_classes=(IsAuthenticated,),
+            renderer_classes=(TextShoppingListRenderer,
+                              CSVShoppingListRenderer,
+                              PDFShoppingListRenderer,
+                              *api_settings.DEFAULT_RENDERER_CLASSES))
     def download_shopping_cart(self, request):
-        ingredients = RecipeIngredient.objects.filter(
-            recipe__shoppingcart__user=request.user
-        ).values(
-            'ingredient__name', 'ingredient__measurement_unit'
-        ).annotate(
-            total_amount=Sum('amount')
-        ).order_by('ingredient__name')
-        return FileResponse(
-            shopping_cart_data(ingredients),
-            content_type='text/plain'
+        return shopping_cart_response(
+            request.user, request.accepted_renderer.format
         )
 
     @action(detail=True, methods=['get'], url_path='get-link',
             permission_classes=(AllowAny,))
     def get_link(self, request, pk=None):
-        recipe = get_object_or_404(Recipe, id=pk)
+        recipe_id = get_object_or_404(
+            Recipe.objects.values_list('id', flat=True), id=pk
+        )
         url = request.build_absolute_uri(
-            reverse('short_link_redirect', args=[recipe.short_url])
+            reverse('short_link_redirect', args=[short_link_code(recipe_id)])
         )
         return Response({'short-link': url}, status=status.HTTP_200_OK)
@@ -106,6 +106,29 @@ else:
         }
     }
 
+# Версии данных (ETag, снимки справочников, индекс ингредиентов) хранятся
+# в базе, а не в кэше, и видны всем процессам при любом бэкенде.
+# Кэш представлений рецептов читается по ключу с версией рецепта из базы,
+# поэтому локальный для процесса LocMemCache даёт верные данные; общий
+# бэкенд (CACHE_BACKEND, CACHE_LOCATION) только повышает долю попаданий.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
+RECIPE_CACHE_ENABLED = os.getenv('RECIPE_CACHE_ENABLED', 'True') == 'True'
+RECIPE_CACHE_ALIAS = 'default'
+RECIPE_CACHE_TIMEOUT = int(os.getenv('RECIPE_CACHE_TIMEOUT', 60 * 60))
+
+SHOPPING_LIST_PDF_FONT_PATH = os.getenv(
+    'SHOPPING_LIST_PDF_FONT_PATH',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -142,6 +165,17 @@ STATIC_ROOT = BASE_DIR / 'collected_static'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = '/media/'
 
+# Файлы из multipart/form-data больше FILE_UPLOAD_MAX_MEMORY_SIZE
+# Django пишет во временный файл, а не держит в памяти.
+UPLOAD_IMAGE_MAX_SIZE = int(
+    os.getenv('UPLOAD_IMAGE_MAX_SIZE', 10 * 1024 * 1024)
+)
+# Множитель перестановки id в коротких ссылках: нечётный и не кратный 31
+# (взаимно простой с 62 ** 6). 1 — коды идут подряд.
+SHORT_LINK_MULTIPLIER = int(os.getenv('SHORT_LINK_MULTIPLIER', 790257979))
+# Потоки, готовящие уменьшенные копии изображений; 0 — прямо в запросе.
+IMAGE_RENDITION_WORKERS = int(os.getenv('IMAGE_RENDITION_WORKERS', 2))
+
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -0,0 +1,39 @@
+import hashlib
+import os
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    # Имя файла — sha256 содержимого: одинаковые загрузки делят один файл.
+    # Неиспользуемые файлы удаляет команда collect_media.
+
+    @staticmethod
+    def content_hash(content):
+        digest = hashlib.sha256()
+        content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        return digest.hexdigest()
+
+    def hashed_name(self, name, content):
+        digest = self.content_hash(content)
+        extension = os.path.splitext(name)[1].lower()
+        return os.path.join(
+            os.path.dirname(name), digest[:2], f'{digest}{extension}'
+        )
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.hashed_name(name, content)
+        if self.exists(name):
+            # Свежее время изменения защищает файл от collect_media,
+            # пока новая ссылка на него ещё не записана в базу.
+            os.utime(self.path(name))
+            return name
+        return super().save(name, content, max_length)
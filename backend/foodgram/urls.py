@@ -3,13 +3,12 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 
-from recipes.views import ShortLinkRedirectView
+from recipes.views import short_link_redirect
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('api.urls')),
-    path('s/<slug:slug>/', ShortLinkRedirectView.as_view(),
-         name='short_link_redirect'),
+    path('s/<slug:slug>/', short_link_redirect, name='short_link_redirect'),
 ]
 
 if settings.DEBUG:
@@ -1,30 +1,47 @@
 from django.contrib import admin
 from django.contrib.auth.models import Group
+from django.db.models import Prefetch
 from django.utils.safestring import mark_safe
 
 from recipes.constants import Config
 from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
                             ShoppingCart, Tag)
+from recipes.renditions import rendition_url
 
 
 class RecipeIngredientInline(admin.TabularInline):
     model = RecipeIngredient
     extra = 0
     min_num = 1
+    autocomplete_fields = ('ingredient',)
 
 
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
     list_display = ('image_display', 'name', 'author', 'short_text',
                     'ingredients_list', 'tags_list', 'favorites_count')
-    list_filter = ('author',)
-    filter_horizontal = ('ingredients',)
+    list_filter = ('tags',)
+    list_select_related = ('author',)
+    search_fields = ('name', 'author__username')
+    autocomplete_fields = ('author', 'tags')
+    show_full_result_count = False
     inlines = (RecipeIngredientInline, )
 
+    def get_queryset(self, request):
+        # Ингредиенты и теги всей страницы загружаются двумя запросами.
+        return super().get_queryset(request).prefetch_related(
+            'tags',
+            Prefetch(
+                'recipeingredient_set',
+                queryset=RecipeIngredient.objects.select_related('ingredient')
+            )
+        )
+
     @admin.display(description='Изображение')
     def image_display(self, recipe):
         return mark_safe(
-            f'<img src={recipe.image.url} width="60" height="60">'
+            f'<img src={rendition_url(recipe.image, Config.THUMBNAIL)} '
+            f'width="60" height="60">'
         )
 
     @staticmethod
@@ -46,30 +63,35 @@ class RecipeAdmin(admin.ModelAdmin):
             tag_in_recipe.name for tag_in_recipe in recipe.tags.all()
         )
 
-    @admin.display(description='В избранном раз')
-    def favorites_count(self, recipe):
-        return recipe.favorite_set.count()
-
 
 @admin.register(Tag)
 class TagAdmin(admin.ModelAdmin):
     list_display = ('name', 'slug')
+    search_fields = ('name', 'slug')
 
 
 @admin.register(Ingredient)
 class IngredientAdmin(admin.ModelAdmin):
     list_display = ('name', 'measurement_unit')
+    search_fields = ('name',)
+    show_full_result_count = False
 
 
 @admin.register(Favorite)
 class UserRecipeAdmin(admin.ModelAdmin):
     list_display = ('user', 'recipe')
+    list_select_related = ('user', 'recipe')
+    autocomplete_fields = ('user', 'recipe')
+    show_full_result_count = False
     unique_together = ('user', 'recipe')
 
 
 @admin.register(ShoppingCart)
 class ShoppingCartAdmin(admin.ModelAdmin):
     list_display = ('user', 'recipe')
+    list_select_related = ('user', 'recipe')
+    autocomplete_fields = ('user', 'recipe')
+    show_full_result_count = False
     unique_together = ('user', 'recipe')
 
 
@@ -1,8 +1,14 @@
 # -*- coding: utf-8 -*-
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class RecipesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'recipes'
     verbose_name = 'Рецепты'
+
+    def ready(self):
+        import recipes.signals  # noqa: F401
+        from recipes.search import install_sqlite_index
+        post_migrate.connect(install_sqlite_index, sender=self)
@@ -11,10 +11,24 @@ class Config:
     MIN_COOKING_TIME = 1
     MAX_COOKING_TIME = 32767
     MAX_URL_LENGTH = 4
+    SHORT_LINK_LENGTH = 6
+    SHORT_LINK_CACHE_SIZE = 4096
     NAME_RECIPE_MAX_LENGTH = 256
+    SCOPE_MAX_LENGTH = 64
     MIN_INGREDIENT_AMOUNT = 1
     MAX_INGREDIENT_AMOUNT = 32767
 
+    # Уменьшенные копии изображений: имя -> (ширина, высота)
+    DIRECTORY_RENDITIONS = 'renditions/'
+    THUMBNAIL = 'thumbnail'
+    CARD = 'card'
+    RENDITIONS = {
+        THUMBNAIL: (120, 120),
+        CARD: (480, 480),
+        'full': (1600, 1600),
+    }
+    RENDITION_FORMATS = {'jpg': ('JPEG', 85), 'webp': ('WEBP', 80)}
+
     # Verbose name
     NAME_INGREDIENT = 'Названия ингредиента'
     MEASUREMENT_UNIT = 'Единица измерения'
@@ -29,6 +43,12 @@ class Config:
     ADD_TIME = 'Время добавления рецепта на сайт'
     AMOUNT = 'Количество ингредиента в рецепте'
     USER = 'Пользователь'
+    TOTAL_AMOUNT = 'Общее количество'
+    FAVORITES_COUNT = 'В избранном раз'
+    CACHE_VERSION = 'Версия кэша'
+    SCOPE = 'Область данных'
+    VERSION = 'Версия'
+    CHANGED_AT = 'Время изменения'
 
     # Verbose/plural для META
     INGREDIENT = 'Ингредиент'
@@ -42,6 +62,10 @@ class Config:
     FAVORITED_RECIPE = 'Понравившейся пользователю рецепт'
     FAVORITED_RECIPES = 'Понравившиеся пользователю рецепты'
     SHOPPING_CART = 'Список покупок'
+    SHOPPING_LIST_ITEM = 'Позиция списка покупок'
+    SHOPPING_LIST_ITEMS = 'Позиции списка покупок'
+    CHANGE_VERSION = 'Версия данных'
+    CHANGE_VERSIONS = 'Версии данных'
 
     # Errors
     MIN_COOKING_TIME_ERROR = (f'Время приготовления должно быть не менее '
@@ -1,12 +1,49 @@
-import random
 import string
 
+from django.conf import settings
+
 from recipes.constants import Config
 
+ALPHABET = string.digits + string.ascii_letters
+SHORT_LINK_SPACE = len(ALPHABET) ** Config.SHORT_LINK_LENGTH
+
+
+def to_base62(number, length=1):
+    code = ''
+    while number or len(code) < length:
+        number, digit = divmod(number, len(ALPHABET))
+        code = ALPHABET[digit] + code
+    return code
+
 
-def generate_short_url():
-    return ''.join(
-        random.choices(
-            string.ascii_letters + string.digits, k=Config.MAX_URL_LENGTH
+def from_base62(code):
+    number = 0
+    for char in code:
+        digit = ALPHABET.find(char)
+        if digit < 0:
+            raise ValueError(code)
+        number = number * len(ALPHABET) + digit
+    return number
+
+
+def short_link_code(recipe_id):
+    # Первые 62 ** 6 id переставляются умножением по модулю и дают коды
+    # ровно из шести символов, следующие кодируются как есть и длиннее.
+    # Преобразование взаимно однозначно, коды не пересекаются.
+    if recipe_id < SHORT_LINK_SPACE:
+        return to_base62(
+            recipe_id * settings.SHORT_LINK_MULTIPLIER % SHORT_LINK_SPACE,
+            Config.SHORT_LINK_LENGTH
         )
-    )
+    return to_base62(recipe_id)
+
+
+def recipe_id_from_code(code):
+    number = from_base62(code)
+    if len(code) == Config.SHORT_LINK_LENGTH:
+        return number * pow(
+            settings.SHORT_LINK_MULTIPLIER, -1, SHORT_LINK_SPACE
+        ) % SHORT_LINK_SPACE
+    if number >= SHORT_LINK_SPACE and not code.startswith(ALPHABET[0]):
+        return number
+    raise ValueError(code)
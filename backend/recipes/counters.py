@@ -0,0 +1,41 @@
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import Favorite, Recipe
+from users.models import Subscription
+
+User = get_user_model()
+
+# (модель, поле счётчика, считаемая модель, ссылка на модель)
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'subscribers_count', Subscription, 'author'),
+)
+
+
+def change_counter(model, pks, field, delta):
+    counters = model.objects.filter(pk__in=pks)
+    if delta < 0:
+        counters = counters.filter(**{f'{field}__gte': -delta})
+    counters.update(**{field: F(field) + delta})
+
+
+def count_subquery(related_model, related_field):
+    return Coalesce(
+        Subquery(
+            related_model.objects.filter(**{related_field: OuterRef('pk')})
+            .order_by()
+            .values(related_field)
+            .annotate(total=Count('pk'))
+            .values('total')
+        ),
+        0
+    )
+
+
+def recount(model, field, related_model, related_field, ids):
+    return model.objects.filter(pk__in=ids).exclude(
+        **{field: count_subquery(related_model, related_field)}
+    ).update(**{field: count_subquery(related_model, related_field)})
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.3 on 2026-10-18 17:20
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='recipeingredient',
+            options={'verbose_name': 'Ингредиенты рецепта', 'verbose_name_plural': 'Ингредиенты для рецепта'},
+        ),
+    ]
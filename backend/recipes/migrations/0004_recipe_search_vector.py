@@ -0,0 +1,37 @@
+from django.db import migrations
+
+POSTGRES_FORWARD = (
+    "ALTER TABLE recipes_recipe ADD COLUMN search_vector tsvector "
+    "GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('russian', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('russian', coalesce(text, '')), 'B')"
+    ") STORED",
+    "CREATE INDEX recipes_recipe_search_vector_idx "
+    "ON recipes_recipe USING GIN (search_vector)",
+)
+POSTGRES_BACKWARD = (
+    'DROP INDEX IF EXISTS recipes_recipe_search_vector_idx',
+    'ALTER TABLE recipes_recipe DROP COLUMN IF EXISTS search_vector',
+)
+
+
+def run_on_postgres(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor == 'postgresql':
+            for statement in statements:
+                schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0003_recipeingredient_no_ordering'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_on_postgres(POSTGRES_FORWARD),
+            run_on_postgres(POSTGRES_BACKWARD),
+        ),
+    ]
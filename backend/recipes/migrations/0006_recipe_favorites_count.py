@@ -0,0 +1,49 @@
+# Generated by Django 3.2.3 on 2026-10-18 17:32
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_subquery(related_model, related_field):
+    return Coalesce(
+        Subquery(
+            related_model.objects.filter(**{related_field: OuterRef('pk')})
+            .order_by()
+            .values(related_field)
+            .annotate(total=Count('pk'))
+            .values('total')
+        ),
+        0
+    )
+
+
+def fill_counters(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Favorite = apps.get_model('recipes', 'Favorite')
+    User = apps.get_model('users', 'FoodGramUser')
+    Subscription = apps.get_model('users', 'Subscription')
+    Recipe.objects.update(
+        favorites_count=count_subquery(Favorite, 'recipe')
+    )
+    User.objects.update(
+        recipes_count=count_subquery(Recipe, 'author'),
+        subscribers_count=count_subquery(Subscription, 'author')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_shoppinglistitem'),
+        ('users', '0002_user_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В избранном раз'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 3.2.3 on 2026-10-18 17:42
+
+from django.db import migrations, models
+import foodgram.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_recipe_favorites_count'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(storage=foodgram.storage.ContentAddressedStorage(), upload_to='recipes/', verbose_name='Изображение рецепта'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.3 on 2026-10-18 17:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_alter_recipe_image'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='short_url',
+            field=models.CharField(blank=True, editable=False, max_length=4, null=True, unique=True, verbose_name='Короткая ссылка на рецепт'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 3.2.3 on 2026-10-18 18:03
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_alter_recipe_short_url'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(max_length=64, unique=True, verbose_name='Область данных')),
+                ('version', models.PositiveBigIntegerField(default=0, verbose_name='Версия')),
+                ('changed_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Время изменения')),
+            ],
+            options={
+                'verbose_name': 'Версия данных',
+                'verbose_name_plural': 'Версии данных',
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.3 on 2026-10-18 18:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_changeversion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='cache_version',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Версия кэша'),
+        ),
+    ]
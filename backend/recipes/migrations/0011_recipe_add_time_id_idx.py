@@ -0,0 +1,17 @@
+# Generated by Django 3.2.3 on 2026-10-18 18:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_recipe_cache_version'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['add_time', 'id'], name='recipe_add_time_id_idx'),
+        ),
+    ]
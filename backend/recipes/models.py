@@ -2,9 +2,13 @@ from django.contrib.auth import get_user_model
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
 from django.db.models import UniqueConstraint
+from django.urls import reverse
+from django.utils import timezone
+
+from foodgram.storage import ContentAddressedStorage
 
 from .constants import Config
-from .core import generate_short_url
+from .core import short_link_code
 
 User = get_user_model()
 
@@ -86,6 +90,7 @@ class Recipe(models.Model):
     image = models.ImageField(
         Config.IMAGE_RECIPE,
         upload_to=Config.DIRECTORY_RECIPE,
+        storage=ContentAddressedStorage(),
     )
     text = models.TextField(Config.TEXT_RECIPE)
     cooking_time = models.PositiveSmallIntegerField(
@@ -101,28 +106,61 @@ class Recipe(models.Model):
             )
         )
     )
+    # Коды ссылок выводятся из id (recipes.core.short_link_code),
+    # здесь остаются только коды рецептов, созданных до этого.
     short_url = models.CharField(
         Config.SHORT_URL,
         max_length=Config.MAX_URL_LENGTH,
         unique=True,
+        null=True,
+        blank=True,
+        editable=False,
     )
     add_time = models.DateTimeField(
         Config.ADD_TIME,
         auto_now_add=True
     )
+    favorites_count = models.PositiveIntegerField(
+        Config.FAVORITES_COUNT,
+        default=0,
+        editable=False
+    )
+
+    # Растёт при каждом изменении рецепта или связанных с ним данных
+    # и входит в ключ кэша представления (api.cache.RecipeCache).
+    cache_version = models.PositiveIntegerField(
+        Config.CACHE_VERSION,
+        default=0,
+        editable=False
+    )
+
+    COUNTER_FIELDS = ('favorites_count', 'cache_version')
 
     class Meta:
         verbose_name = Config.RECIPE
         verbose_name_plural = Config.RECIPES
         ordering = ('-add_time',)
+        # Граница страницы курсорной пагинации: (add_time, id) < (%s, %s).
+        indexes = (
+            models.Index(
+                fields=('add_time', 'id'), name='recipe_add_time_id_idx'
+            ),
+        )
 
     def save(self, *args, **kwargs):
-        if not self.short_url:
-            self.short_url = generate_short_url()
+        # Счётчики меняются только F()-выражениями, обычное сохранение
+        # не должно перезаписывать их устаревшими значениями.
+        if not self._state.adding and 'update_fields' not in kwargs:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.COUNTER_FIELDS
+                and field.attname not in self.get_deferred_fields()
+            ]
         super().save(*args, **kwargs)
 
     def get_absolute_url(self):
-        return f'{self.short_url}'
+        return reverse('short_link_redirect', args=[short_link_code(self.id)])
 
     def __str__(self):
         return self.name[:Config.LENGTH_ON_STR]
@@ -156,7 +194,6 @@ class RecipeIngredient(models.Model):
     class Meta:
         verbose_name = Config.INGREDIENT_RECIPE
         verbose_name_plural = Config.INGREDIENTS_RECIPE
-        ordering = ('recipe',)
         constraints = (
             models.UniqueConstraint(
                 fields=('recipe', 'ingredient'),
@@ -207,3 +244,51 @@ class ShoppingCart(UserRecipe):
     class Meta(UserRecipe.Meta):
         verbose_name = Config.SHOPPING_CART
         verbose_name_plural = Config.SHOPPING_CART
+
+
+class ShoppingListItem(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name=Config.USER,
+        related_name='shopping_list'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        verbose_name=Config.NAME_INGREDIENT
+    )
+    total_amount = models.IntegerField(Config.TOTAL_AMOUNT)
+
+    class Meta:
+        verbose_name = Config.SHOPPING_LIST_ITEM
+        verbose_name_plural = Config.SHOPPING_LIST_ITEMS
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='shopping_list_item_unique'
+            ),
+        )
+
+    def __str__(self):
+        return (f'{self.ingredient.name[:Config.LENGTH_ON_STR]} -> '
+                f'{self.user.username[:Config.LENGTH_ON_STR]}')
+
+
+class ChangeVersion(models.Model):
+    # Версии данных хранятся в базе, чтобы их видели все процессы:
+    # воркеры сервера и management-команды.
+    scope = models.CharField(
+        Config.SCOPE,
+        max_length=Config.SCOPE_MAX_LENGTH,
+        unique=True
+    )
+    version = models.PositiveBigIntegerField(Config.VERSION, default=0)
+    changed_at = models.DateTimeField(Config.CHANGED_AT, default=timezone.now)
+
+    class Meta:
+        verbose_name = Config.CHANGE_VERSION
+        verbose_name_plural = Config.CHANGE_VERSIONS
+
+    def __str__(self):
+        return f'{self.scope}: {self.version}'
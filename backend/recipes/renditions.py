@@ -0,0 +1,118 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.dispatch import Signal
+from PIL import Image, ImageOps
+
+from recipes.constants import Config
+
+logger = logging.getLogger(__name__)
+
+# Отправляется после того, как все копии изображения записаны.
+renditions_ready = Signal()
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def rendition_name(name, rendition, extension):
+    return f'{Config.DIRECTORY_RENDITIONS}{name}/{rendition}.{extension}'
+
+
+def rendition_names(name):
+    return [
+        rendition_name(name, rendition, extension)
+        for rendition in Config.RENDITIONS
+        for extension in Config.RENDITION_FORMATS
+    ]
+
+
+def renditions_exist(name):
+    # Копии пишутся по порядку, последняя появляется в самом конце.
+    return default_storage.exists(rendition_names(name)[-1])
+
+
+def rendition_urls(name):
+    if not name or not renditions_exist(name):
+        return None
+    return {
+        rendition: {
+            extension: default_storage.url(
+                rendition_name(name, rendition, extension)
+            )
+            for extension in Config.RENDITION_FORMATS
+        }
+        for rendition in Config.RENDITIONS
+    }
+
+
+def rendition_url(image, rendition=Config.CARD, extension='jpg'):
+    if image and renditions_exist(image.name):
+        return default_storage.url(
+            rendition_name(image.name, rendition, extension)
+        )
+    return image.url if image else None
+
+
+def make_renditions(name):
+    with default_storage.open(name) as source:
+        image = ImageOps.exif_transpose(Image.open(source))
+        image = image.convert('RGB')
+    for rendition, size in Config.RENDITIONS.items():
+        resized = image.copy()
+        resized.thumbnail(size, Image.LANCZOS)
+        for extension, (image_format, quality) in (
+            Config.RENDITION_FORMATS.items()
+        ):
+            buffer = BytesIO()
+            resized.save(buffer, image_format, quality=quality)
+            path = rendition_name(name, rendition, extension)
+            default_storage.delete(path)
+            default_storage.save(path, ContentFile(buffer.getvalue()))
+    renditions_ready.send(sender=None, name=name)
+
+
+def _make_renditions_logged(name):
+    try:
+        make_renditions(name)
+    except Exception:
+        logger.exception('Не удалось подготовить копии %s', name)
+
+
+def _make_renditions_in_worker(name):
+    try:
+        _make_renditions_logged(name)
+    finally:
+        # У каждого потока пула своё соединение с базой.
+        connection.close()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.IMAGE_RENDITION_WORKERS,
+                thread_name_prefix='renditions'
+            )
+        return _executor
+
+
+def schedule_renditions(image):
+    # Изображение обрабатывается в пуле потоков после фиксации транзакции,
+    # запрос не ждёт Pillow. Без потоков копии готовятся сразу.
+    if not image or renditions_exist(image.name):
+        return
+    name = image.name
+    if settings.IMAGE_RENDITION_WORKERS:
+        transaction.on_commit(
+            lambda: _get_executor().submit(_make_renditions_in_worker, name)
+        )
+    else:
+        transaction.on_commit(lambda: _make_renditions_logged(name))
@@ -0,0 +1,109 @@
+import re
+
+from django.db import connection, connections
+from django.db.models import FloatField
+from django.db.models.expressions import RawSQL
+
+from recipes.models import Recipe
+
+RUSSIAN_ENDINGS = sorted(
+    (
+        'иями', 'ями', 'ами', 'ого', 'его', 'ому', 'ему', 'ыми', 'ими',
+        'ой', 'ей', 'ий', 'ый', 'ая', 'яя', 'ое', 'ее', 'ые', 'ие', 'ов',
+        'ев', 'ам', 'ям', 'ах', 'ях', 'ом', 'ем', 'ую', 'юю', 'а', 'я', 'о',
+        'е', 'ы', 'и', 'у', 'ю', 'ь', 'й',
+    ),
+    key=len,
+    reverse=True
+)
+MIN_STEM_LENGTH = 3
+SQLITE_FTS_TABLE = f'{Recipe._meta.db_table}_fts'
+SQLITE_FTS_SQL = (
+    f'CREATE VIRTUAL TABLE IF NOT EXISTS {SQLITE_FTS_TABLE} '
+    f'USING fts5(name, text)',
+    f'CREATE TRIGGER IF NOT EXISTS {SQLITE_FTS_TABLE}_insert '
+    f'AFTER INSERT ON {Recipe._meta.db_table} BEGIN '
+    f'INSERT INTO {SQLITE_FTS_TABLE}(rowid, name, text) VALUES ('
+    f"new.id, replace(replace(new.name, 'ё', 'е'), 'Ё', 'Е'), "
+    f"replace(replace(new.text, 'ё', 'е'), 'Ё', 'Е')); END",
+    f'CREATE TRIGGER IF NOT EXISTS {SQLITE_FTS_TABLE}_update '
+    f'AFTER UPDATE ON {Recipe._meta.db_table} BEGIN '
+    f'DELETE FROM {SQLITE_FTS_TABLE} WHERE rowid = old.id; '
+    f'INSERT INTO {SQLITE_FTS_TABLE}(rowid, name, text) VALUES ('
+    f"new.id, replace(replace(new.name, 'ё', 'е'), 'Ё', 'Е'), "
+    f"replace(replace(new.text, 'ё', 'е'), 'Ё', 'Е')); END",
+    f'CREATE TRIGGER IF NOT EXISTS {SQLITE_FTS_TABLE}_delete '
+    f'AFTER DELETE ON {Recipe._meta.db_table} BEGIN '
+    f'DELETE FROM {SQLITE_FTS_TABLE} WHERE rowid = old.id; END',
+    f'DELETE FROM {SQLITE_FTS_TABLE}',
+    f'INSERT INTO {SQLITE_FTS_TABLE}(rowid, name, text) '
+    f"SELECT id, replace(replace(name, 'ё', 'е'), 'Ё', 'Е'), "
+    f"replace(replace(text, 'ё', 'е'), 'Ё', 'Е') "
+    f'FROM {Recipe._meta.db_table}',
+)
+
+
+def install_sqlite_index(sender, using, **kwargs):
+    # В SQLite Django пересоздаёт таблицу при изменении схемы и триггеры
+    # пропадают, поэтому индекс восстанавливается после каждой миграции.
+    database = connections[using]
+    if (
+        database.vendor != 'sqlite'
+        or Recipe._meta.db_table not in database.introspection.table_names()
+    ):
+        return
+    with database.cursor() as cursor:
+        for statement in SQLITE_FTS_SQL:
+            cursor.execute(statement)
+
+
+def stem(word):
+    for ending in RUSSIAN_ENDINGS:
+        if (
+            word.endswith(ending)
+            and len(word) - len(ending) >= MIN_STEM_LENGTH
+        ):
+            return word[:-len(ending)]
+    return word
+
+
+def sqlite_match_query(query):
+    words = re.findall(r'\w+', query.lower().replace('ё', 'е'))
+    return ' '.join(f'"{stem(word)}"*' for word in words)
+
+
+def search_recipes(queryset, query):
+    table = Recipe._meta.db_table
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                                    SearchVectorField)
+        vector = RawSQL(
+            f'{table}.search_vector', (), output_field=SearchVectorField()
+        )
+        search_query = SearchQuery(
+            query, config='russian', search_type='websearch'
+        )
+        return (
+            queryset.alias(search_vector=vector)
+            .filter(search_vector=search_query)
+            .annotate(search_rank=SearchRank(vector, search_query))
+            .order_by('-search_rank', '-add_time')
+        )
+    match = sqlite_match_query(query)
+    if not match:
+        return queryset.none()
+    return (
+        queryset.filter(id__in=RawSQL(
+            f'SELECT rowid FROM {SQLITE_FTS_TABLE} '
+            f'WHERE {SQLITE_FTS_TABLE} MATCH %s',
+            (match,)
+        ))
+        .annotate(search_rank=RawSQL(
+            f'SELECT bm25({SQLITE_FTS_TABLE}, 10.0, 1.0) '
+            f'FROM {SQLITE_FTS_TABLE} WHERE {SQLITE_FTS_TABLE} MATCH %s '
+            f'AND rowid = {table}.id',
+            (match,),
+            output_field=FloatField()
+        ))
+        .order_by('search_rank', '-add_time')
+    )
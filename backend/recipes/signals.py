@@ -0,0 +1,72 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from recipes.counters import COUNTERS, change_counter
+from recipes.models import Recipe
+from recipes.renditions import schedule_renditions
+from recipes.views import recipe_id_for_link
+
+User = get_user_model()
+
+
+def counter_created(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        for model, field, related_model, related_field in COUNTERS:
+            if related_model is sender:
+                change_counter(
+                    model, (getattr(instance, f'{related_field}_id'),),
+                    field, 1
+                )
+
+
+def counter_deleted(sender, instance, **kwargs):
+    for model, field, related_model, related_field in COUNTERS:
+        if related_model is sender:
+            change_counter(
+                model, (getattr(instance, f'{related_field}_id'),),
+                field, -1
+            )
+
+
+def counter_reassigned(sender, instance, raw, update_fields, **kwargs):
+    # Ссылку можно поменять в админке (например, автора рецепта):
+    # единица счётчика переходит от прежнего объекта к новому.
+    if raw or instance._state.adding:
+        return
+    for model, field, related_model, related_field in COUNTERS:
+        if related_model is not sender or (
+            update_fields is not None and related_field not in update_fields
+        ):
+            continue
+        old_id = sender.objects.filter(pk=instance.pk).values_list(
+            f'{related_field}_id', flat=True
+        ).first()
+        new_id = getattr(instance, f'{related_field}_id')
+        if old_id is not None and old_id != new_id:
+            change_counter(model, (old_id,), field, -1)
+            change_counter(model, (new_id,), field, 1)
+
+
+for _, _, counted_model, _ in COUNTERS:
+    receiver(pre_save, sender=counted_model)(counter_reassigned)
+    receiver(post_save, sender=counted_model)(counter_created)
+    receiver(post_delete, sender=counted_model)(counter_deleted)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_image_saved(sender, instance, raw, **kwargs):
+    if not raw:
+        schedule_renditions(instance.image)
+
+
+@receiver(post_save, sender=User)
+def avatar_saved(sender, instance, raw, update_fields, **kwargs):
+    if not raw and (update_fields is None or 'avatar' in update_fields):
+        schedule_renditions(instance.avatar)
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    # Кэш ссылок в каждом процессе свой; здесь очищается только текущий.
+    recipe_id_for_link.cache_clear()
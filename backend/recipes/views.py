@@ -1,11 +1,27 @@
+from functools import lru_cache
+
+from django.http import Http404
 from django.shortcuts import redirect
-from rest_framework.generics import get_object_or_404
-from rest_framework.views import APIView
 
+from recipes.constants import Config
+from recipes.core import recipe_id_from_code
 from recipes.models import Recipe
 
 
-class ShortLinkRedirectView(APIView):
-    def get(self, request, slug):
-        recipe = get_object_or_404(Recipe, short_url=slug)
-        return redirect(f'/recipes/{recipe.id}/')
+@lru_cache(maxsize=Config.SHORT_LINK_CACHE_SIZE)
+def recipe_id_for_link(code):
+    # Кэшируются только найденные рецепты: DoesNotExist lru_cache
+    # не запоминает. Коды старого формата ищутся по short_url.
+    try:
+        lookup = {'id': recipe_id_from_code(code)}
+    except ValueError:
+        lookup = {'short_url': code}
+    return Recipe.objects.filter(**lookup).values_list('id', flat=True).get()
+
+
+def short_link_redirect(request, slug):
+    try:
+        recipe_id = recipe_id_for_link(slug)
+    except Recipe.DoesNotExist:
+        raise Http404
+    return redirect(f'/recipes/{recipe_id}/')
@@ -0,0 +1,43 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from recipes.models import Recipe
+from recipes.renditions import make_renditions, renditions_exist
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Build resized copies for existing recipe images and avatars'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Rebuild copies that already exist'
+        )
+
+    def _build(self, name):
+        try:
+            make_renditions(name)
+        except Exception as error:
+            self.stderr.write(f'{name}: {error}')
+            return False
+        return True
+
+    def handle(self, *args, **options):
+        names = {
+            *Recipe.objects.values_list('image', flat=True),
+            *User.objects.exclude(avatar='').exclude(avatar=None)
+            .values_list('avatar', flat=True),
+        }
+        names.discard('')
+        if not options['force']:
+            names = {name for name in names if not renditions_exist(name)}
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            built = sum(executor.map(self._build, sorted(names)))
+        self.stdout.write(
+            f'Подготовлено копий изображений: {built} из {len(names)}'
+        )
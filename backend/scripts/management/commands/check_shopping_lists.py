@@ -0,0 +1,67 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db.models import Exists, OuterRef
+from django.db.transaction import atomic
+
+from api.core import lock_user
+from api.shopping_list import calculate_shopping_list
+from recipes.models import ShoppingCart, ShoppingListItem
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Check shopping lists against carts and rebuild broken ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Only report differences, do not fix them'
+        )
+
+    @atomic
+    def _check_user(self, user_id, dry_run):
+        # Та же блокировка, что у изменений корзины: они ждут, пока
+        # список пересчитывается, и не теряются при перезаписи.
+        lock_user(user_id)
+        expected = calculate_shopping_list(user_id)
+        stored = dict(
+            ShoppingListItem.objects.filter(user_id=user_id)
+            .values_list('ingredient_id', 'total_amount')
+        )
+        if stored == expected:
+            return False
+        for ingredient_id in sorted({*stored, *expected}):
+            if stored.get(ingredient_id) != expected.get(ingredient_id):
+                self.stdout.write(
+                    f'Пользователь {user_id}, ингредиент {ingredient_id}: '
+                    f'в списке {stored.get(ingredient_id)}, '
+                    f'должно быть {expected.get(ingredient_id)}'
+                )
+        if not dry_run:
+            ShoppingListItem.objects.filter(user_id=user_id).delete()
+            ShoppingListItem.objects.bulk_create(
+                ShoppingListItem(
+                    user_id=user_id,
+                    ingredient_id=ingredient_id,
+                    total_amount=total_amount
+                )
+                for ingredient_id, total_amount in expected.items()
+            )
+        return True
+
+    def handle(self, *args, **options):
+        user_ids = User.objects.filter(
+            Exists(ShoppingCart.objects.filter(user=OuterRef('pk')))
+            | Exists(ShoppingListItem.objects.filter(user=OuterRef('pk')))
+        ).order_by('id').values_list('id', flat=True)
+        checked = broken = 0
+        for user_id in user_ids.iterator(chunk_size=options['batch_size']):
+            checked += 1
+            broken += self._check_user(user_id, options['dry_run'])
+        self.stdout.write(
+            f'Проверено списков покупок: {checked}\n'
+            f'С расхождениями: {broken}'
+            + ('' if options['dry_run'] or not broken else ' (исправлены)')
+        )
@@ -0,0 +1,107 @@
+import os
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from recipes.constants import Config as RecipesConfig
+from recipes.models import Recipe
+from users.constants import Config as UsersConfig
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Delete media files not referenced by recipes or users'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--min-age', type=int, default=60 * 60,
+            help='Keep files younger than this many seconds'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Only report unreferenced files, do not delete them'
+        )
+
+    def _walk(self, path):
+        if not default_storage.exists(path):
+            return
+        directories, files = default_storage.listdir(path)
+        for file_name in files:
+            yield os.path.join(path, file_name)
+        for directory in directories:
+            yield from self._walk(os.path.join(path, directory))
+
+    def _batches(self, batch_size):
+        batch = []
+        for directory in (RecipesConfig.DIRECTORY_RECIPE,
+                          UsersConfig.DIRECTORY_AVATAR,
+                          RecipesConfig.DIRECTORY_RENDITIONS):
+            for name in self._walk(directory):
+                batch.append(name)
+                if len(batch) == batch_size:
+                    yield batch
+                    batch = []
+        if batch:
+            yield batch
+
+    @staticmethod
+    def _original_name(name):
+        # Копия renditions/<оригинал>/<размер>.<формат> живёт,
+        # пока жив оригинал.
+        if name.startswith(RecipesConfig.DIRECTORY_RENDITIONS):
+            return os.path.dirname(
+                name[len(RecipesConfig.DIRECTORY_RENDITIONS):]
+            )
+        return name
+
+    @staticmethod
+    def _remove_empty_directory(path):
+        try:
+            os.rmdir(default_storage.path(path))
+        except OSError:
+            pass
+
+    @staticmethod
+    def _referenced(names):
+        return {
+            *Recipe.objects.filter(image__in=names)
+            .values_list('image', flat=True),
+            *User.objects.filter(avatar__in=names)
+            .values_list('avatar', flat=True),
+        }
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        threshold = timezone.now() - timedelta(seconds=options['min_age'])
+        started = time.monotonic()
+        scanned = orphans = freed = 0
+        for batch in self._batches(options['batch_size']):
+            scanned += len(batch)
+            referenced = self._referenced(
+                {self._original_name(name) for name in batch}
+            )
+            for name in batch:
+                if self._original_name(name) in referenced:
+                    continue
+                if default_storage.get_modified_time(name) > threshold:
+                    continue
+                orphans += 1
+                freed += default_storage.size(name)
+                if dry_run:
+                    self.stdout.write(name)
+                else:
+                    default_storage.delete(name)
+                    self._remove_empty_directory(os.path.dirname(name))
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            f'Просмотрено файлов: {scanned} за {elapsed:.1f} с '
+            f'({scanned / elapsed if elapsed else scanned:.0f} файлов/с)\n'
+            f'Без ссылок: {orphans}, {freed / 1024 / 1024:.1f} МБ'
+            + (' (не удалены, --dry-run)' if dry_run else ' (удалены)')
+        )
@@ -0,0 +1,180 @@
+import base64
+import json
+import tarfile
+import time
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, Tag)
+from scripts.streaming import batched
+
+User = get_user_model()
+
+IMAGES_INLINE = 'inline'
+IMAGES_ARCHIVE = 'archive'
+IMAGES_NAMES = 'names'
+
+
+class Command(BaseCommand):
+    help = (
+        'Export users, tags, ingredients, recipes, favorites and shopping '
+        'carts as JSON lines. The file contains password hashes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', type=Path)
+        parser.add_argument(
+            '--images', default=IMAGES_ARCHIVE,
+            choices=(IMAGES_INLINE, IMAGES_ARCHIVE, IMAGES_NAMES),
+            help='base64 inside records, a tar file next to them or only '
+                 'file names for a target that shares this media storage'
+        )
+        parser.add_argument(
+            '--archive', type=Path,
+            help='tar file for images, <path>.images.tar by default'
+        )
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def _image(self, name):
+        if not name:
+            return None
+        if not default_storage.exists(name):
+            self.missing_images += 1
+            return None
+        if self.images == IMAGES_NAMES:
+            return name
+        if self.images == IMAGES_INLINE:
+            with default_storage.open(name) as file:
+                return {
+                    'name': name,
+                    'data': base64.b64encode(file.read()).decode(),
+                }
+        # Одинаковые изображения лежат в одном файле хранилища,
+        # в архив каждый файл попадает один раз.
+        if name not in self.archived:
+            info = tarfile.TarInfo(name)
+            info.size = default_storage.size(name)
+            info.mtime = time.time()
+            with default_storage.open(name) as file:
+                self.archive.addfile(info, file)
+            self.archived.add(name)
+        return name
+
+    def _users(self, batch_size):
+        for user in User.objects.order_by('id').values(
+            'id', 'email', 'username', 'first_name', 'last_name',
+            'password', 'avatar'
+        ).iterator(chunk_size=batch_size):
+            user['avatar'] = self._image(user['avatar'])
+            yield {'type': 'user', **user}
+
+    @staticmethod
+    def _catalogue(model, record_type, fields, batch_size):
+        for item in model.objects.order_by('id').values(
+            'id', *fields
+        ).iterator(chunk_size=batch_size):
+            yield {'type': record_type, **item}
+
+    def _recipes(self, batch_size):
+        # На PostgreSQL iterator() читает через серверный курсор;
+        # теги и ингредиенты подгружаются отдельно для каждой пачки.
+        recipes = Recipe.objects.order_by('id').values(
+            'id', 'author_id', 'name', 'text', 'cooking_time', 'image',
+            'add_time'
+        ).iterator(chunk_size=batch_size)
+        for batch in batched(recipes, batch_size):
+            ids = [recipe['id'] for recipe in batch]
+            tags = {recipe_id: [] for recipe_id in ids}
+            for recipe_id, tag_id in Recipe.tags.through.objects.filter(
+                recipe_id__in=ids
+            ).values_list('recipe_id', 'tag_id'):
+                tags[recipe_id].append(tag_id)
+            ingredients = {recipe_id: [] for recipe_id in ids}
+            for recipe_id, ingredient_id, amount in (
+                RecipeIngredient.objects.filter(recipe_id__in=ids)
+                .values_list('recipe_id', 'ingredient_id', 'amount')
+            ):
+                ingredients[recipe_id].append([ingredient_id, amount])
+            for recipe in batch:
+                yield {
+                    'type': 'recipe',
+                    'id': recipe['id'],
+                    'author': recipe['author_id'],
+                    'name': recipe['name'],
+                    'text': recipe['text'],
+                    'cooking_time': recipe['cooking_time'],
+                    'image': self._image(recipe['image']),
+                    'add_time': recipe['add_time'].isoformat(),
+                    'tags': tags[recipe['id']],
+                    'ingredients': ingredients[recipe['id']],
+                }
+
+    @staticmethod
+    def _relations(model, record_type, batch_size):
+        for user_id, recipe_id in model.objects.order_by('id').values_list(
+            'user_id', 'recipe_id'
+        ).iterator(chunk_size=batch_size):
+            yield {'type': record_type, 'user': user_id, 'recipe': recipe_id}
+
+    def _write(self, file, record_type, records):
+        count = 0
+        started = time.monotonic()
+        for record in records:
+            file.write(json.dumps(record, ensure_ascii=False))
+            file.write('\n')
+            count += 1
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            f'{record_type}: {count} за {elapsed:.1f} с '
+            f'({count / elapsed if elapsed else 0:.0f} записей/с)'
+        )
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size должен быть больше нуля')
+        self.images = options['images']
+        self.missing_images = 0
+        self.archived = set()
+        self.archive = None
+        archive_path = Path(
+            options['archive'] or f'{path}.images.tar'
+        )
+        if self.images == IMAGES_ARCHIVE:
+            self.archive = tarfile.open(archive_path, 'w')
+        try:
+            with open(path, 'w', encoding='utf-8') as file:
+                # Порядок важен: импорт сопоставляет ссылки на записи,
+                # прочитанные раньше.
+                self._write(file, 'user', self._users(batch_size))
+                self._write(file, 'tag', self._catalogue(
+                    Tag, 'tag', ('name', 'slug'), batch_size
+                ))
+                self._write(file, 'ingredient', self._catalogue(
+                    Ingredient, 'ingredient', ('name', 'measurement_unit'),
+                    batch_size
+                ))
+                self._write(file, 'recipe', self._recipes(batch_size))
+                self._write(file, 'favorite', self._relations(
+                    Favorite, 'favorite', batch_size
+                ))
+                self._write(file, 'shopping_cart', self._relations(
+                    ShoppingCart, 'shopping_cart', batch_size
+                ))
+        finally:
+            if self.archive is not None:
+                self.archive.close()
+        self.stdout.write(f'Записано в {path}')
+        if self.archive is not None:
+            self.stdout.write(
+                f'Изображения ({len(self.archived)}) в {archive_path}'
+            )
+        if self.missing_images:
+            self.stderr.write(
+                f'Не найдено файлов изображений: {self.missing_images}'
+            )
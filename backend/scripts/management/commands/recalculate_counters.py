@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.db.transaction import atomic
+
+from recipes.counters import COUNTERS, recount
+
+
+class Command(BaseCommand):
+    help = 'Recalculate stored favorite, recipe and subscriber counters'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        for model, field, related_model, related_field in COUNTERS:
+            ids = list(
+                model.objects.order_by('pk').values_list('pk', flat=True)
+            )
+            fixed = 0
+            for start in range(0, len(ids), batch_size):
+                with atomic():
+                    fixed += recount(
+                        model, field, related_model, related_field,
+                        ids[start:start + batch_size]
+                    )
+            self.stdout.write(
+                f'{model._meta.verbose_name_plural}.{field}: '
+                f'исправлено {fixed} из {len(ids)}'
+            )
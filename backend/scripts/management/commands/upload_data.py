@@ -1,41 +1,200 @@
-from django.core.management.base import BaseCommand
+import csv
+import io
+import time
+from pathlib import Path
 
-from recipes.models import Ingredient, Tag
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, connection, transaction
+
+from api.autocomplete import ingredient_index
+from api.cache import change_versions
+from api.signals import recipes_changed
+from recipes.models import Ingredient, Recipe, Tag
+from scripts.streaming import batched, iter_csv_rows, iter_json_objects
+
+DEFAULT_TAGS = (
+    ('завтрак', 'breakfast'),
+    ('обед', 'lunch'),
+    ('ужин', 'dinner'),
+)
 
 
 class Command(BaseCommand):
-    help = 'Download ingredients and tags from csv file'
+    help = 'Upload ingredients and tags from csv or json files'
 
-    def handle(self, *args, **options):
-        self.stdout.write(
-            f'Начинаю загрузку {Ingredient._meta.verbose_name} в базу...'
-        )
-        with open('ingredients.csv', 'r', encoding='utf-8') as file:
-            ingredients = [
-                Ingredient(name=name, measurement_unit=measurement_unit)
-                for line in file
-                for name, measurement_unit in [line.strip().rsplit(',', 1)]
-            ]
-            Ingredient.objects.bulk_create(ingredients, ignore_conflicts=True)
-        self.stdout.write(
-            f'Загрузка {Ingredient._meta.verbose_name} в базу - ЗАВЕРШЕНА\n'
-            f'Всего ингредиентов в базе: {Ingredient.objects.count()}\n'
-            f'-----------------------------------------------'
-        )
-        tags = [
-            ('завтрак', 'breakfast'),
-            ('обед', 'lunch'),
-            ('ужин', 'dinner'),
-        ]
-        self.stdout.write(
-            f'Начинаю загрузку {Tag._meta.verbose_name} тегов в базу...'
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--ingredients', type=Path,
+            default=settings.BASE_DIR / 'ingredients.csv',
+            help='csv (name,unit), json array or json lines file'
+        )
+        parser.add_argument(
+            '--tags', type=Path,
+            help='csv (name,slug) or json file; built-in tags by default'
         )
-        tag_objects = [
-            Tag(name=name, slug=slug) for name, slug in tags
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--no-copy', action='store_true',
+            help='Do not use COPY on PostgreSQL'
+        )
+
+    @staticmethod
+    def _read(path, fields):
+        # Строки отдаются по одной, файл целиком в память не читается.
+        with open(path, encoding='utf-8-sig', newline='') as file:
+            if path.suffix.lower() == '.csv':
+                yield from iter_csv_rows(file)
+            else:
+                for item in iter_json_objects(file):
+                    yield (
+                        [item.get(field) for field in fields]
+                        if isinstance(item, dict) else item
+                    )
+
+    @staticmethod
+    def _clean(rows, model, fields, stats):
+        max_lengths = [model._meta.get_field(field).max_length
+                       for field in fields]
+        for row in rows:
+            stats['rows'] += 1
+            if (
+                not isinstance(row, (list, tuple))
+                or len(row) != len(fields)
+                or not all(isinstance(value, str) for value in row)
+            ):
+                stats['skipped'] += 1
+                continue
+            row = tuple(value.strip() for value in row)
+            if not all(row) or any(
+                len(value) > max_length
+                for value, max_length in zip(row, max_lengths)
+            ):
+                stats['skipped'] += 1
+                continue
+            yield row
+
+    @staticmethod
+    def _upsert_sql(model, fields, conflict_fields, source):
+        quote = connection.ops.quote_name
+        update_fields = [
+            field for field in fields if field not in conflict_fields
         ]
-        Tag.objects.bulk_create(tag_objects, ignore_conflicts=True)
+        conflict = (
+            'DO UPDATE SET ' + ', '.join(
+                f'{quote(field)} = EXCLUDED.{quote(field)}'
+                for field in update_fields
+            )
+            if update_fields else 'DO NOTHING'
+        )
+        return (
+            f'INSERT INTO {quote(model._meta.db_table)} '
+            f'({", ".join(map(quote, fields))}) {source} '
+            f'ON CONFLICT ({", ".join(map(quote, conflict_fields))}) '
+            f'{conflict}'
+        )
+
+    def _upsert_values(self, cursor, model, fields, conflict_fields, batch):
+        # Одна строка не может обновиться дважды за запрос.
+        batch = list({
+            tuple(row[fields.index(field)] for field in conflict_fields): row
+            for row in batch
+        }.values())
+        placeholders = ', '.join(
+            ['(' + ', '.join(['%s'] * len(fields)) + ')'] * len(batch)
+        )
+        cursor.execute(
+            self._upsert_sql(
+                model, fields, conflict_fields, f'VALUES {placeholders}'
+            ),
+            [value for row in batch for value in row]
+        )
+        return cursor.rowcount
+
+    def _upsert_copy(self, cursor, model, fields, conflict_fields, batch):
+        # PostgreSQL: пакет уходит COPY во временную таблицу,
+        # оттуда одним INSERT ... SELECT с ON CONFLICT.
+        quote = connection.ops.quote_name
+        staging = quote(f'{model._meta.db_table}_import')
+        columns = ', '.join(map(quote, fields))
+        cursor.execute(
+            f'CREATE TEMP TABLE IF NOT EXISTS {staging} '
+            f'ON COMMIT DELETE ROWS AS SELECT {columns} '
+            f'FROM {quote(model._meta.db_table)} WITH NO DATA'
+        )
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(batch)
+        buffer.seek(0)
+        cursor.copy_expert(
+            f'COPY {staging} ({columns}) FROM STDIN WITH (FORMAT csv)',
+            buffer
+        )
+        conflict_columns = ', '.join(map(quote, conflict_fields))
+        cursor.execute(
+            self._upsert_sql(
+                model, fields, conflict_fields,
+                f'SELECT DISTINCT ON ({conflict_columns}) {columns} '
+                f'FROM {staging}'
+            )
+        )
+        return cursor.rowcount
+
+    def _import(self, path, model, fields, conflict_fields, rows, options):
+        stats = {'rows': 0, 'skipped': 0, 'saved': 0}
+        upsert = (
+            self._upsert_copy
+            if connection.vendor == 'postgresql' and not options['no_copy']
+            else self._upsert_values
+        )
+        started = time.monotonic()
+        for batch in batched(
+            self._clean(rows, model, fields, stats), options['batch_size']
+        ):
+            try:
+                with transaction.atomic(), connection.cursor() as cursor:
+                    stats['saved'] += upsert(
+                        cursor, model, fields, conflict_fields, batch
+                    )
+            except IntegrityError as error:
+                raise CommandError(
+                    f'{model._meta.verbose_name_plural} ({path}): {error}'
+                )
+        elapsed = time.monotonic() - started
         self.stdout.write(
-            f'Загрузка {Tag._meta.verbose_name} в базу - ЗАВЕРШЕНА\n'
-            f'Всего тегов в базе: {Tag.objects.count()}\n'
-            f'-----------------------------------------------'
+            f'{model._meta.verbose_name_plural} ({path}): '
+            f'строк {stats["rows"]} за {elapsed:.1f} с '
+            f'({stats["rows"] / elapsed if elapsed else 0:.0f} строк/с), '
+            f'добавлено или обновлено {stats["saved"]}, '
+            f'пропущено {stats["skipped"]}\n'
+            f'Всего в базе: {model.objects.count()}'
+        )
+
+    def handle(self, *args, **options):
+        for option in ('ingredients', 'tags'):
+            if options[option] is None:
+                continue
+            options[option] = Path(options[option])
+            if not options[option].is_file():
+                raise CommandError(f'Файл {options[option]} не найден')
+        ingredient_fields = ('name', 'measurement_unit')
+        self._import(
+            options['ingredients'], Ingredient, ingredient_fields,
+            ingredient_fields,
+            self._read(options['ingredients'], ingredient_fields), options
+        )
+        change_versions.bump('ingredients')
+        ingredient_index.reset()
+
+        tag_fields = ('name', 'slug')
+        self._import(
+            options['tags'] or 'встроенные', Tag, tag_fields, ('slug',),
+            self._read(options['tags'], tag_fields)
+            if options['tags'] else DEFAULT_TAGS,
+            options
+        )
+        change_versions.bump('tags')
+        # Названия тегов входят в кэшированные представления рецептов.
+        recipes_changed(
+            Recipe.objects.filter(tags__isnull=False)
+            .values_list('id', flat=True).distinct()
         )
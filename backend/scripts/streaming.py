@@ -0,0 +1,62 @@
+import csv
+import json
+from itertools import islice
+
+READ_CHUNK_SIZE = 64 * 1024
+ITEM_DELIMITERS = ' \t\r\n,]'
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def iter_csv_rows(file):
+    yield from csv.reader(file)
+
+
+def iter_json_objects(file):
+    # Массив JSON любого размера читается кусками и разбирается
+    # по одному элементу; строки JSON Lines читаются построчно.
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    in_array = None
+    while True:
+        chunk = file.read(READ_CHUNK_SIZE)
+        buffer = buffer[position:] + chunk
+        position = 0
+        while True:
+            while position < len(buffer) and (
+                buffer[position].isspace() or buffer[position] == ','
+            ):
+                position += 1
+            if position == len(buffer):
+                break
+            if in_array is None:
+                in_array = buffer[position] == '['
+                if in_array:
+                    position += 1
+                    continue
+            if in_array and buffer[position] == ']':
+                return
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if not chunk:
+                    raise
+                break
+            if chunk and (
+                end == len(buffer) or buffer[end] not in ITEM_DELIMITERS
+            ):
+                # Число в конце куска может быть неполным: ждём
+                # разделитель после элемента.
+                break
+            position = end
+            yield item
+        if not chunk:
+            return
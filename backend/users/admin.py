@@ -2,6 +2,8 @@ from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from django.utils.safestring import mark_safe
 
+from recipes.constants import Config
+from recipes.renditions import rendition_url
 from users import models
 
 
@@ -9,28 +11,33 @@ from users import models
 class FoodGramUserAdmin(UserAdmin):
     list_display = ('image_display', 'username', 'email', 'first_name',
                     'last_name', 'count_recipes', 'is_subscribed')
-    list_filter = ('username',)
+    list_filter = ('is_staff', 'is_active')
     list_display_links = ('image_display', 'username',)
     list_per_page = 20
+    show_full_result_count = False
     verbose_name = 'Пользователи'
 
     @admin.display(description='Аватар')
     def image_display(self, user):
         if user.avatar:
             return mark_safe(
-                f'<img src={user.avatar.url} width="60" height="60">'
+                f'<img src={rendition_url(user.avatar, Config.THUMBNAIL)} '
+                f'width="60" height="60">'
             )
 
     @admin.display(description='Количество рецептов')
     def count_recipes(self, user):
-        return user.recipes.count()
+        return user.recipes_count
 
     @admin.display(description='Количество подписок')
     def is_subscribed(self, user):
-        return user.subs_from_user.count()
+        return user.subscribers_count
 
 
 @admin.register(models.Subscription)
 class SubscriptionAdmin(admin.ModelAdmin):
     list_display = ('user', 'author')
+    list_select_related = ('user', 'author')
+    autocomplete_fields = ('user', 'author')
     list_per_page = 20
+    show_full_result_count = False
@@ -15,6 +15,8 @@ class Config:
     FIRST_NAME = 'Имя'
     LAST_NAME = 'Фамилия'
     AVATAR = 'Аватар пользователя'
+    RECIPES_COUNT = 'Количество рецептов'
+    SUBSCRIBERS_COUNT = 'Количество подписчиков'
     FOLLOWER = 'Подписан'
     FOODGRAM_USER = 'Пользователь'
 
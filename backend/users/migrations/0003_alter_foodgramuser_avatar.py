@@ -0,0 +1,19 @@
+# Generated by Django 3.2.3 on 2026-10-18 17:42
+
+from django.db import migrations, models
+import foodgram.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_user_counters'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='foodgramuser',
+            name='avatar',
+            field=models.ImageField(blank=True, null=True, storage=foodgram.storage.ContentAddressedStorage(), upload_to='users/', verbose_name='Аватар пользователя'),
+        ),
+    ]
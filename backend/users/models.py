@@ -4,6 +4,7 @@ from django.core.exceptions import ValidationError
 from django.db import models
 from django.db.models import F, Q
 
+from foodgram.storage import ContentAddressedStorage
 from users.constants import Config
 
 
@@ -33,15 +34,40 @@ class FoodGramUser(AbstractUser):
     avatar = models.ImageField(
         Config.AVATAR,
         upload_to=Config.DIRECTORY_AVATAR,
+        storage=ContentAddressedStorage(),
         null=True,
         blank=True,
     )
+    recipes_count = models.PositiveIntegerField(
+        Config.RECIPES_COUNT,
+        default=0,
+        editable=False,
+    )
+    subscribers_count = models.PositiveIntegerField(
+        Config.SUBSCRIBERS_COUNT,
+        default=0,
+        editable=False,
+    )
+
+    COUNTER_FIELDS = ('recipes_count', 'subscribers_count')
 
     class Meta:
         verbose_name = Config.USER
         verbose_name_plural = Config.USERS
         ordering = ('username',)
 
+    def save(self, *args, **kwargs):
+        # Счётчики меняются только F()-выражениями, обычное сохранение
+        # не должно перезаписывать их устаревшими значениями.
+        if not self._state.adding and 'update_fields' not in kwargs:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.COUNTER_FIELDS
+                and field.attname not in self.get_deferred_fields()
+            ]
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return self.username[:Config.LENGTH_ON_STR]
 